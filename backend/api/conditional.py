@@ -0,0 +1,106 @@
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from recipes.models import VersionStamp
+
+
+def bump_version(key: str):
+    """Увеличение версии данных по ключу."""
+    updated = VersionStamp.objects.filter(key=key).update(
+        version=F('version') + 1,
+        modified=timezone.now()
+    )
+    if not updated:
+        VersionStamp.objects.get_or_create(key=key)
+
+
+def bump_versions(keys):
+    """Увеличение версий для набора ключей."""
+    keys = list(keys)
+    VersionStamp.objects.filter(key__in=keys).update(
+        version=F('version') + 1,
+        modified=timezone.now()
+    )
+    VersionStamp.objects.bulk_create(
+        (VersionStamp(key=key) for key in keys), ignore_conflicts=True
+    )
+
+
+def get_stamps(keys):
+    """Версии и даты изменения для набора ключей одним запросом."""
+    return {
+        key: (version, modified)
+        for key, version, modified in VersionStamp.objects.filter(
+            key__in=keys
+        ).values_list('key', 'version', 'modified')
+    }
+
+
+def get_versions(keys):
+    """Версии для набора ключей. Отсутствующие ключи имеют версию 0."""
+    stamps = get_stamps(keys)
+    return {key: stamps.get(key, (0,))[0] for key in keys}
+
+
+def get_validators(keys, *extra):
+    """
+    Сильный ETag и время последнего изменения для набора ключей
+    одним запросом. Отсутствующие ключи имеют версию 0.
+    """
+    stamps = get_stamps(keys)
+    parts = [f'{key}:{stamps.get(key, (0,))[0]}' for key in sorted(keys)]
+    parts.extend(str(value) for value in extra)
+    etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    last_modified = max(
+        (modified for _, modified in stamps.values()), default=None
+    )
+    return f'"{etag}"', last_modified
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list/retrieve.
+    Ответ 304 возвращается до выборки объектов и сериализации.
+    """
+
+    version_keys = ()
+    conditional_actions = ('list', 'retrieve')
+
+    def get_version_keys(self):
+        return list(self.version_keys)
+
+    def get_validator_extra(self):
+        """Значения, от которых зависит представление ответа."""
+        return (self.request.accepted_media_type,)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = get_validators(
+            self.get_version_keys(), *self.get_validator_extra()
+        )
+        timestamp = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from foodgram.constants import Constants
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def get_large_author_ids(author_ids):
+    """
+    Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT.
+    Их рецепты не раскладываются по лентам, а читаются при запросе.
+    """
+    return set(User.objects.filter(
+        id__in=author_ids,
+        followers_count__gt=Constants.FEED_FANOUT_LIMIT
+    ).values_list('id', flat=True))
+
+
+def fan_out(recipes):
+    """Добавление новых рецептов в ленты подписчиков их авторов."""
+    author_ids = {recipe.author_id for recipe in recipes}
+    author_ids -= get_large_author_ids(author_ids)
+    if not author_ids:
+        return
+    followers = defaultdict(list)
+    for author_id, user_id in Subscription.objects.filter(
+        following_id__in=author_ids
+    ).values_list('following_id', 'user_id'):
+        followers[author_id].append(user_id)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe.pk,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date
+            )
+            for recipe in recipes
+            for user_id in followers[recipe.author_id]
+        ),
+        batch_size=Constants.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id: int, author_id: int):
+    """Добавление последних рецептов автора в ленту нового подписчика."""
+    if get_large_author_ids([author_id]):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).order_by('-pub_date').values_list(
+                'id', 'pub_date'
+            )[:Constants.FEED_BACKFILL_SIZE]
+        ),
+        batch_size=Constants.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def get_feed_sources(user):
+    """
+    Запросы с полями pub_date и recipe_id, из которых собирается лента:
+    таблица ленты и рецепты крупных авторов из подписок.
+    """
+    large_author_ids = get_large_author_ids(
+        Subscription.objects.filter(user=user).values('following_id')
+    )
+    sources = [TimelineEntry.objects.filter(user=user)]
+    if large_author_ids:
+        sources[0] = sources[0].exclude(author_id__in=large_author_ids)
+        sources.append(Recipe.objects.filter(
+            author_id__in=large_author_ids
+        ).annotate(recipe_id=F('id')))
+    return sources
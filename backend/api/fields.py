@@ -1,17 +1,109 @@
 import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from rest_framework import serializers
 
+from api.images import variants_are_ready
+from foodgram.constants import Constants
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Добавление изображений к рецептам кодируя в base64
+    или файлом в multipart/form-data.
+    Base64 декодируется частями во временный файл,
+    размер проверяется до декодирования.
     """
 
+    default_error_messages = {
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+        'invalid_base64': 'Некорректные данные base64.',
+    }
+    chunk_size = 64 * 1024
+
+    def __init__(self, *args, max_size=Constants.MAX_IMAGE_SIZE, **kwargs):
+        self.max_size = max_size
+        super().__init__(*args, **kwargs)
+
+    def decode(self, data: str):
+        format, separator, imgstr = data.partition(';base64,')
+        if not separator:
+            self.fail('invalid_base64')
+        # Переносы строк допустимы в base64, но сдвигают границы частей.
+        imgstr = ''.join(imgstr.split())
+        ext = format.split('/')[-1]
+        if len(imgstr) * 3 // 4 > self.max_size:
+            self.fail('too_large', max_size=self.max_size)
+        image = TemporaryUploadedFile(
+            'temp.' + ext, format.split(':')[-1], 0, None
+        )
+        try:
+            for start in range(0, len(imgstr), self.chunk_size):
+                image.write(base64.b64decode(
+                    imgstr[start:start + self.chunk_size], validate=True
+                ))
+        except (binascii.Error, ValueError):
+            image.close()
+            self.fail('invalid_base64')
+        image.size = image.tell()
+        image.seek(0)
+        return image
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data)
+        elif getattr(data, 'size', 0) > self.max_size:
+            self.fail('too_large', max_size=self.max_size)
         return super().to_internal_value(data)
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Уменьшенные варианты изображения рецепта в WebP и JPEG.
+    Пока варианты не созданы, все размеры ссылаются на оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def get_variants(recipe):
+        """Варианты с относительными ссылками."""
+        if not recipe.image:
+            return None
+        ready = variants_are_ready(recipe)
+        original = recipe.image.url
+        variants = {}
+        for label, _ in Constants.IMAGE_VARIANT_WIDTHS:
+            variant = recipe.image_variants[label] if ready else None
+            variants[label] = {
+                'url': (
+                    default_storage.url(variant['jpeg']) if variant
+                    else original
+                ),
+                'webp': default_storage.url(variant['webp']) if variant
+                else None,
+                'width': variant['width'] if variant else None,
+            }
+        return variants
+
+    @staticmethod
+    def make_absolute(variants, request):
+        if not variants or not request:
+            return variants
+        return {
+            label: {
+                key: request.build_absolute_uri(value)
+                if key != 'width' and value else value
+                for key, value in variant.items()
+            } for label, variant in variants.items()
+        }
+
+    def to_representation(self, recipe):
+        return self.make_absolute(
+            self.get_variants(recipe), self.context.get('request')
+        )
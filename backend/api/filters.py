@@ -1,34 +1,131 @@
+from django.db.models import Case, Exists, IntegerField, OuterRef, When
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import OrderingFilter, SearchFilter
 
-from recipes.models import Recipe, Tag, User
+from api.indexes import (ingredient_index, recipe_coverage_index,
+                         tag_catalog)
+from api.search import recipe_search_index
+from foodgram.constants import Constants
+from recipes.models import Cart, FavoritRecipe, Recipe
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_catalog.get_slugs()]
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(filters.FilterSet):
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    """
+    Фильтры рецептов. Теги, избранное и список покупок проверяются
+    подзапросами EXISTS, поэтому рецепты не дублируются.
+    Слаги тегов сверяются с каталогом в памяти процесса,
+    автор фильтруется по id без загрузки пользователя.
+    """
+    author = filters.NumberFilter(field_name='author_id')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='_tags'
     )
 
     is_favorited = filters.NumberFilter(method='_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(method='_is_in_shopping_cart')
+    search = filters.CharFilter(method='_search')
+    have = NumberInFilter(method='_have')
 
     class Meta:
         model = Recipe
         fields = ['tags', 'author']
 
-    def _is_favorited(self, queryset, name, value):
+    def _tags(self, queryset, name, value):
+        slugs = tag_catalog.get_slugs()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[slugs[slug] for slug in value if slug in slugs]
+        )))
+
+    def _user_relation(self, queryset, model, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(model.objects.filter(
+                recipe_id=OuterRef('pk'), user=self.request.user
+            )))
         return queryset
 
+    def _is_favorited(self, queryset, name, value):
+        return self._user_relation(queryset, FavoritRecipe, value)
+
     def _is_in_shopping_cart(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(shop_list__user=self.request.user)
-        return queryset
+        return self._user_relation(queryset, Cart, value)
+
+    @staticmethod
+    def _ranked(queryset, recipe_ids):
+        if not recipe_ids:
+            return queryset.none()
+        return queryset.filter(id__in=recipe_ids).order_by(Case(
+            *[When(id=recipe_id, then=position)
+              for position, recipe_id in enumerate(recipe_ids)],
+            output_field=IntegerField()
+        ))
+
+    def _search(self, queryset, name, value):
+        return self._ranked(queryset, recipe_search_index.search(value))
+
+    def _have(self, queryset, name, value,
+              limit=Constants.COVERAGE_RESULTS_LIMIT,
+              candidates_limit=Constants.COVERAGE_CANDIDATES_LIMIT):
+        """
+        Рецепты по доле ингредиентов, которые есть у пользователя.
+        Лучшие кандидаты из индекса проверяются остальными фильтрами
+        одним запросом, порядок ранжирования сохраняется.
+        """
+        ranked = recipe_coverage_index.rank(
+            int(item) for item in value
+        )[:candidates_limit].tolist()
+        allowed = set(queryset.filter(
+            id__in=ranked
+        ).order_by().values_list('id', flat=True)) if ranked else set()
+        return self._ranked(queryset, [
+            recipe_id for recipe_id in ranked if recipe_id in allowed
+        ][:limit])
 
 
 class IngredientSearchFilter(SearchFilter):
+    """
+    Поиск ингредиентов по названию через индекс в памяти процесса.
+    С параметром fuzzy=1 выполняется поиск с учетом опечаток.
+    """
     search_param = 'name'
+    fuzzy_param = 'fuzzy'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param)
+        if not name or view.action != 'list':
+            return super().filter_queryset(request, queryset, view)
+        if request.query_params.get(self.fuzzy_param) in ('1', 'true'):
+            return ingredient_index.fuzzy_search(name)
+        return ingredient_index.search(name)
+
+
+class AliasOrderingFilter(OrderingFilter):
+    """
+    Сортировка с псевдонимами: ordering_aliases вьюсета задает
+    для имени из ordering_fields фактическое поле сортировки.
+    """
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        aliases = getattr(view, 'ordering_aliases', {})
+        ordering = []
+        for term in super().remove_invalid_fields(
+            queryset, fields, view, request
+        ):
+            field = aliases.get(term.lstrip('-'))
+            if field is None:
+                ordering.append(term)
+            elif term.startswith('-'):
+                ordering.append(field[1:] if field.startswith('-')
+                                else f'-{field}')
+            else:
+                ordering.append(field)
+        return ordering
@@ -0,0 +1,152 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from api.conditional import bump_version
+from foodgram.constants import Constants
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+executor = ThreadPoolExecutor(
+    max_workers=Constants.IMAGE_WORKERS,
+    thread_name_prefix='image-variants'
+)
+normalize_executor = ThreadPoolExecutor(
+    max_workers=Constants.IMAGE_NORMALIZE_WORKERS,
+    thread_name_prefix='image-normalize'
+)
+
+
+def variant_name(name: str, label: str, extension: str) -> str:
+    """Имя файла варианта рядом с оригиналом."""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{label}.{extension}'
+
+
+def read_dimensions(file) -> tuple:
+    """Размеры изображения по заголовку, без декодирования пикселей."""
+    file.seek(0)
+    with Image.open(file) as image:
+        size = image.size
+    file.seek(0)
+    return size
+
+
+def encode(image: Image.Image) -> tuple:
+    """
+    Сжатие изображения в бюджет размера.
+    Изображения с прозрачностью сохраняются в PNG,
+    остальные в JPEG с понижением качества до бюджета.
+    """
+    buffer = BytesIO()
+    if image.mode == 'RGBA':
+        image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    for quality in Constants.IMAGE_QUALITY_STEPS:
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True)
+        if buffer.tell() <= Constants.IMAGE_SIZE_BUDGET:
+            break
+    return buffer.getvalue(), 'jpg'
+
+
+def normalize_image(file) -> ContentFile:
+    """
+    Подготовка загруженного изображения к хранению:
+    поворот по EXIF, уменьшение до MAX_IMAGE_SIDE по длинной стороне,
+    удаление метаданных и пересжатие.
+    """
+    side = Constants.MAX_IMAGE_SIDE
+    file.seek(0)
+    with Image.open(file) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (side, side))
+        image = ImageOps.exif_transpose(image)
+        transparent = (
+            image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info
+        )
+        image = image.convert('RGBA' if transparent else 'RGB')
+        image.info = {}
+        image.thumbnail((side, side), Image.LANCZOS)
+        data, extension = encode(image)
+    saved = file.size - len(data)
+    logger.info(
+        'Изображение %s: %d -> %d байт, сэкономлено %d байт',
+        file.name, file.size, len(data), saved,
+        extra={'bytes_saved': saved}
+    )
+    root, _ = os.path.splitext(os.path.basename(file.name))
+    return ContentFile(data, name=f'{root}.{extension}')
+
+
+def render_variants(name: str) -> dict:
+    """
+    Создание уменьшенных вариантов изображения в WebP и JPEG.
+    Работает только с хранилищем файлов, без обращений к БД.
+    """
+    variants = {'source': name}
+    with default_storage.open(name) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for label, width in Constants.IMAGE_VARIANT_WIDTHS:
+            variant = image.copy()
+            variant.thumbnail((width, variant.height), Image.LANCZOS)
+            files = {'width': variant.width}
+            for extension, image_format in FORMATS:
+                buffer = BytesIO()
+                variant.save(
+                    buffer, image_format,
+                    quality=Constants.IMAGE_VARIANT_QUALITY
+                )
+                files[extension] = default_storage.save(
+                    variant_name(name, label, extension),
+                    ContentFile(buffer.getvalue())
+                )
+            variants[label] = files
+    return variants
+
+
+def store_variants(recipe_id: int, variants: dict):
+    """Сохранение вариантов, если изображение рецепта не изменилось."""
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=variants['source']
+    ).update(image_variants=variants)
+    if updated:
+        bump_version(f'recipe:{recipe_id}')
+
+
+def generate_variants(recipe_id: int, name: str):
+    """Задача фонового потока: создание и сохранение вариантов."""
+    try:
+        store_variants(recipe_id, render_variants(name))
+    except Exception:
+        logger.exception('Не удалось создать варианты изображения %s', name)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe: Recipe):
+    """Создание вариантов в фоне после фиксации транзакции."""
+    if not recipe.image:
+        return
+    name = recipe.image.name
+    if recipe.image_variants.get('source') == name:
+        return
+    transaction.on_commit(
+        lambda: executor.submit(generate_variants, recipe.pk, name)
+    )
+
+
+def variants_are_ready(recipe: Recipe) -> bool:
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') == recipe.image.name
+    )
@@ -0,0 +1,298 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from api.conditional import get_versions
+from api.similarity import load_pairs
+from foodgram.constants import Constants
+from recipes.models import Ingredient, RecipeIngredient, Tag, VersionStamp
+
+
+def normalize(value: str) -> str:
+    """Приведение строки к виду для поиска без учета регистра."""
+    return value.casefold().replace('ё', 'е').strip()
+
+
+def trigrams(value: str) -> set:
+    """
+    Триграммы строки по аналогии с pg_trgm: каждое слово дополняется
+    двумя пробелами в начале и одним в конце.
+    """
+    result = set()
+    for word in normalize(value).split():
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Строится из таблицы Ingredient при первом обращении и
+    перестраивается после изменения ингредиентов в любом процессе:
+    перед поиском сверяется версия ingredient.
+    """
+
+    version_key = 'ingredient'
+
+    def __init__(self, ttl: int = Constants.INGREDIENT_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        """Сброс индекса, он будет построен заново при следующем поиске."""
+        self._index = None
+
+    def _is_stale(self, version):
+        return (self._index is None or self._version != version
+                or time.monotonic() - self._built_at > self.ttl)
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.only('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: normalize(ingredient.name)
+        )
+        keys = [normalize(ingredient.name) for ingredient in ingredients]
+        grams = [
+            trigrams(f'{ingredient.name} {ingredient.measurement_unit}')
+            for ingredient in ingredients
+        ]
+        postings = defaultdict(list)
+        for position, ingredient_grams in enumerate(grams):
+            for gram in ingredient_grams:
+                postings[gram].append(position)
+        self._index = (keys, ingredients, grams, dict(postings))
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def _ensure_built(self):
+        version = get_versions([self.version_key])[self.version_key]
+        if self._is_stale(version):
+            with self._lock:
+                if self._is_stale(version):
+                    self._build(version)
+        return self._index
+
+    def search(self, query: str):
+        """
+        Поиск ингредиентов по началу названия.
+        Совпадения по началу названия идут раньше совпадений
+        по подстроке.
+        """
+        keys, ingredients, *_ = self._ensure_built()
+        query = normalize(query)
+        if not query:
+            return list(ingredients)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        prefix_matches = ingredients[start:end]
+        substring_matches = [
+            ingredient for position, (key, ingredient)
+            in enumerate(zip(keys, ingredients))
+            if not start <= position < end and query in key
+        ]
+        return prefix_matches + substring_matches
+
+    def fuzzy_search(self, query: str,
+                     limit: int = Constants.FUZZY_SEARCH_LIMIT,
+                     threshold: float = Constants.FUZZY_SEARCH_THRESHOLD):
+        """
+        Поиск ингредиентов с опечатками по триграммам названия и
+        единицы измерения. Кандидаты ранжируются по доле совпавших
+        триграмм запроса, при равенстве по коэффициенту Жаккара.
+        """
+        _, ingredients, grams, postings = self._ensure_built()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(postings.get(gram, ()))
+        scored = (
+            (
+                count / len(query_grams),
+                count / (len(query_grams) + len(grams[position]) - count),
+                position
+            )
+            for position, count in shared.items()
+            if count / len(query_grams) >= threshold
+        )
+        best = heapq.nlargest(
+            limit, scored, key=lambda item: (item[0], item[1], -item[2])
+        )
+        return [ingredients[position] for *_, position in best]
+
+
+class TagCatalog:
+    """
+    Соответствие слагов тегов их id в памяти процесса.
+    Тегов немного, поэтому фильтр рецептов не обращается
+    к таблице тегов при каждом запросе, а только сверяет версию tag,
+    которую меняют изменения тегов в любом процессе.
+    """
+
+    version_key = 'tag'
+
+    def __init__(self, ttl: int = Constants.TAG_CATALOG_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._slugs = None
+        self._version = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        """Сброс каталога, он будет загружен заново при обращении."""
+        self._slugs = None
+
+    def _is_stale(self, version):
+        return (self._slugs is None or self._version != version
+                or time.monotonic() - self._built_at > self.ttl)
+
+    def get_slugs(self):
+        """Словарь слаг -> id тега."""
+        version = get_versions([self.version_key])[self.version_key]
+        if self._is_stale(version):
+            with self._lock:
+                if self._is_stale(version):
+                    self._slugs = dict(Tag.objects.values_list('slug', 'id'))
+                    self._version = version
+                    self._built_at = time.monotonic()
+        return self._slugs
+
+
+class RecipeCoverageIndex:
+    """
+    Обратный индекс ингредиент -> рецепты в памяти процесса
+    для подбора рецептов по имеющимся продуктам.
+    Списки рецептов хранятся массивами numpy, изменения состава рецептов
+    после построения подтягиваются по версиям ingredients:<id>
+    и хранятся отдельно, пока индекс не будет перестроен.
+    """
+
+    def __init__(self, ttl: int = Constants.COVERAGE_INDEX_TTL,
+                 overlay_limit: int = Constants.COVERAGE_OVERLAY_LIMIT):
+        self.ttl = ttl
+        self.overlay_limit = overlay_limit
+        self._lock = threading.Lock()
+        self._index = None
+        self._overlay = {}
+        self._built_at = 0.0
+
+    def invalidate(self):
+        """Сброс индекса, он будет построен заново при следующем запросе."""
+        self._index = None
+
+    def _is_stale(self):
+        return (self._index is None
+                or time.monotonic() - self._built_at > self.ttl
+                or len(self._overlay) > self.overlay_limit)
+
+    @staticmethod
+    def _sync_point():
+        """
+        Время, с которого читаются изменения при следующей синхронизации.
+        Метка версии ставится до фиксации транзакции, возможно в другом
+        процессе, поэтому берется запас: повторное чтение рецепта
+        безвредно, а пропущенное изменение ждало бы перестроения.
+        """
+        return timezone.now() - timedelta(
+            seconds=Constants.COVERAGE_SYNC_MARGIN
+        )
+
+    def _build(self):
+        synced_at = self._sync_point()
+        pairs = load_pairs(
+            RecipeIngredient.objects, 'ingredient_id', 'recipe_id'
+        )
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        recipe_ids, totals = np.unique(pairs[:, 1], return_counts=True)
+        self._index = (
+            ingredient_ids, np.append(starts, len(pairs)), pairs[:, 1],
+            recipe_ids, totals
+        )
+        self._overlay = {}
+        self._synced_at = synced_at
+        self._built_at = time.monotonic()
+
+    def _sync(self):
+        """Состав ингредиентов рецептов, измененных после построения."""
+        synced_at = self._sync_point()
+        changed = [
+            int(key.split(':')[1])
+            for key in VersionStamp.objects.filter(
+                key__startswith='ingredients:',
+                modified__gt=self._synced_at
+            ).values_list('key', flat=True)
+        ]
+        if changed:
+            overlay = dict.fromkeys(changed, frozenset())
+            rows = defaultdict(set)
+            for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=changed
+            ).values_list('recipe_id', 'ingredient_id'):
+                rows[recipe_id].add(ingredient_id)
+            overlay.update(
+                (recipe_id, frozenset(ingredients))
+                for recipe_id, ingredients in rows.items()
+            )
+            self._overlay = {**self._overlay, **overlay}
+        self._synced_at = synced_at
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self._is_stale():
+                self._build()
+            else:
+                self._sync()
+            return self._index, self._overlay
+
+    def rank(self, have):
+        """
+        Идентификаторы рецептов хотя бы с одним ингредиентом из have
+        по убыванию доли имеющихся ингредиентов, при равенстве
+        по возрастанию числа недостающих.
+        """
+        index, overlay = self._ensure_fresh()
+        ingredient_ids, offsets, postings, recipe_ids, totals = index
+        have = np.unique(np.fromiter(have, dtype=np.int64))
+        positions = np.searchsorted(
+            ingredient_ids, have[np.isin(have, ingredient_ids)]
+        )
+        found = np.concatenate([postings[:0]] + [
+            postings[offsets[position]:offsets[position + 1]]
+            for position in positions
+        ])
+        candidates, matched = np.unique(found, return_counts=True)
+        keep = ~np.isin(candidates, np.fromiter(overlay, dtype=np.int64))
+        candidates, matched = candidates[keep], matched[keep]
+        total = totals[np.searchsorted(recipe_ids, candidates)]
+        have = set(have.tolist())
+        extra = [
+            (recipe_id, len(ingredients & have), len(ingredients))
+            for recipe_id, ingredients in overlay.items()
+            if ingredients & have
+        ]
+        if extra:
+            extra = np.array(extra, dtype=np.int64)
+            candidates = np.append(candidates, extra[:, 0])
+            matched = np.append(matched, extra[:, 1])
+            total = np.append(total, extra[:, 2])
+        order = np.lexsort((-candidates, total - matched, -matched / total))
+        return candidates[order]
+
+
+ingredient_index = IngredientIndex()
+recipe_coverage_index = RecipeCoverageIndex()
+tag_catalog = TagCatalog()
@@ -1,11 +1,212 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from foodgram.constants import Constants
+from recipes.models import Recipe
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по ключу (поле сортировки, id).
+    Не выполняет COUNT и OFFSET: каждая страница читается по индексу
+    с позиции, закодированной в непрозрачном курсоре.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = Constants.PAGINATE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = Constants.MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    @staticmethod
+    def supports(queryset):
+        """
+        Курсор хранит значение поля сортировки, поэтому порядок,
+        заданный выражением (ранжирование поиска), им не выражается.
+        """
+        ordering = queryset.query.order_by
+        return not ordering or isinstance(ordering[0], str)
+
+    @staticmethod
+    def get_key(queryset):
+        """
+        Поле сортировки и направление по убыванию.
+        Берется первое поле сортировки запроса,
+        иначе первое поле Meta.ordering модели.
+        """
+        ordering = (
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not ordering:
+            return queryset.model._meta.pk.name, True
+        return ordering[0].lstrip('-'), ordering[0].startswith('-')
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        position = {
+            'value': value.isoformat() if hasattr(value, 'isoformat')
+            else value,
+            'id': obj.pk,
+            'reverse': reverse,
+        }
+        cursor = urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+            model_field = queryset.model._meta.get_field(self.field)
+            return (
+                model_field.to_python(position['value']),
+                int(position['id']),
+                bool(position['reverse'])
+            )
+        except (BinasciiError, ValidationError, ValueError, KeyError,
+                TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), 'page'
+        )
+        self.field, descending = self.get_key(queryset)
+        position = self.decode_cursor(request, queryset)
+        reverse = bool(position and position[2])
+        forward_lookup = 'lt' if descending else 'gt'
+        backward_lookup = 'gt' if descending else 'lt'
+        lookup = backward_lookup if reverse else forward_lookup
+        order = '-' if descending != reverse else ''
+        queryset = queryset.order_by(f'{order}{self.field}', f'{order}pk')
+        if position:
+            value, pk, _ = position
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value})
+                | Q(**{self.field: value, f'pk__{lookup}': pk})
+            )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+        self.next = self.previous = None
+        if results:
+            if has_more or reverse:
+                self.next = self.encode_cursor(results[-1], reverse=False)
+            if (has_more and reverse) or (position and not reverse):
+                self.previous = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next,
+            'previous': self.previous,
+            'results': data,
+        })
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Курсорная пагинация ленты подписок по ключу (pub_date, recipe_id).
+    Каждый источник читается диапазоном по индексу,
+    страница собирается слиянием результатов.
+    """
+
+    def encode_position(self, pub_date, recipe_id):
+        position = {'value': pub_date.isoformat(), 'id': recipe_id}
+        cursor = urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_position(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+            return (
+                Recipe._meta.get_field('pub_date').to_python(
+                    position['value']
+                ),
+                int(position['id'])
+            )
+        except (BinasciiError, ValidationError, ValueError, KeyError,
+                TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_sources(self, sources, request):
+        """Идентификаторы рецептов страницы в порядке ленты."""
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_position(request)
+        rows = set()
+        for source in sources:
+            if position:
+                pub_date, recipe_id = position
+                source = source.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+                )
+            rows.update(source.order_by(
+                '-pub_date', '-recipe_id'
+            ).values_list('pub_date', 'recipe_id')[:self.page_size + 1])
+        rows = sorted(rows, reverse=True)
+        self.next = self.previous = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next = self.encode_position(*rows[-1])
+        return [recipe_id for _, recipe_id in rows]
 
 
 class Pagination(PageNumberPagination):
-    """Кастомная пагинация."""
+    """
+    Кастомная пагинация.
+    С параметром cursor включается курсорная пагинация без подсчета
+    общего количества, иначе используется постраничная page/limit.
+    Результаты с ранжированием по релевантности курсором не
+    листаются и всегда отдаются постранично.
+    """
 
     page_size = Constants.PAGINATE_SIZE
     page_size_query_param = "limit"
     max_page_size = Constants.MAX_PAGE_SIZE
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        cursor_param = self.keyset_pagination_class.cursor_query_param
+        if (cursor_param in request.query_params
+                and self.keyset_pagination_class.supports(queryset)):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
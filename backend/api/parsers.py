@@ -0,0 +1,55 @@
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, MultiPartParser
+
+from foodgram.constants import Constants
+
+
+class ContentLengthLimitMixin:
+    """
+    Отказ по заголовку Content-Length до чтения тела запроса.
+    """
+
+    max_size = None
+
+    def check_content_length(self, request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH', 0))
+        except (TypeError, ValueError):
+            content_length = 0
+        if content_length > self.max_size:
+            raise ParseError(
+                f'Размер запроса превышает {self.max_size} байт.'
+            )
+
+
+class LimitedJSONParser(ContentLengthLimitMixin, JSONParser):
+    """
+    Разбор JSON с ограничением размера тела запроса.
+    Изображение в base64 на треть больше исходного файла.
+    """
+
+    max_size = (
+        Constants.MAX_IMAGE_SIZE * 4 // 3 + Constants.MAX_FORM_DATA_SIZE
+    )
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        self.check_content_length(parser_context['request'])
+        return super().parse(stream, media_type, parser_context)
+
+
+class StreamingMultiPartParser(ContentLengthLimitMixin, MultiPartParser):
+    """
+    Разбор multipart/form-data с записью файлов сразу во временные
+    файлы на диске и ограничением размера тела запроса.
+    """
+
+    max_size = Constants.MAX_IMAGE_SIZE + Constants.MAX_FORM_DATA_SIZE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        self.check_content_length(request)
+        request.upload_handlers = [
+            TemporaryFileUploadHandler(request._request)
+        ]
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,146 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from api.stemmer import stem
+from foodgram.constants import Constants
+from recipes.models import Recipe, RecipeSearchTerm
+
+WORD_RE = re.compile(r'\w+')
+
+
+def analyze(text: str):
+    """Разбиение текста на основы слов."""
+    return [
+        stem(word)[:Constants.MAX_TERM_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+        if len(word) > 1
+    ]
+
+
+class RecipeSearchIndex:
+    """
+    Полнотекстовый поиск рецептов по названию, описанию и ингредиентам
+    с ранжированием BM25. Индекс хранится в таблице RecipeSearchTerm.
+    """
+
+    k1 = 1.2
+    b = 0.75
+    stats_key = 'recipe_search_stats'
+
+    @staticmethod
+    def _terms(recipe: Recipe, ingredient_names):
+        terms = Counter()
+        for term in analyze(recipe.name):
+            terms[term] += Constants.SEARCH_NAME_WEIGHT
+        terms.update(analyze(recipe.text))
+        for name in ingredient_names:
+            terms.update(analyze(name))
+        return terms
+
+    def _rows(self, recipe: Recipe, ingredient_names):
+        terms = self._terms(recipe, ingredient_names)
+        length = sum(terms.values())
+        return [
+            RecipeSearchTerm(
+                recipe=recipe,
+                term=term,
+                frequency=frequency,
+                document_length=length
+            ) for term, frequency in terms.items()
+        ]
+
+    def update(self, recipe: Recipe):
+        """Переиндексация одного рецепта."""
+        ingredient_names = recipe.ingredients.values_list('name', flat=True)
+        rows = self._rows(recipe, ingredient_names)
+        with transaction.atomic():
+            RecipeSearchTerm.objects.filter(recipe=recipe).delete()
+            RecipeSearchTerm.objects.bulk_create(rows)
+        self.invalidate_stats()
+
+    def add(self, documents):
+        """
+        Индексация новых рецептов одной вставкой.
+        documents: пары (рецепт, названия ингредиентов).
+        """
+        rows = []
+        for recipe, ingredient_names in documents:
+            rows.extend(self._rows(recipe, ingredient_names))
+        RecipeSearchTerm.objects.bulk_create(rows)
+        self.invalidate_stats()
+
+    def rebuild(self, batch_size: int = Constants.SEARCH_INDEX_BATCH_SIZE):
+        """Построение индекса с нуля. Возвращает число рецептов."""
+        recipes = Recipe.objects.only('id', 'name', 'text').order_by('id')
+        indexed = 0
+        with transaction.atomic():
+            RecipeSearchTerm.objects.all().delete()
+            last_id = 0
+            while True:
+                batch = list(recipes.filter(
+                    id__gt=last_id
+                ).prefetch_related('ingredients')[:batch_size])
+                if not batch:
+                    break
+                self.add(
+                    (recipe, [ingredient.name
+                              for ingredient in recipe.ingredients.all()])
+                    for recipe in batch
+                )
+                indexed += len(batch)
+                last_id = batch[-1].id
+        self.invalidate_stats()
+        return indexed
+
+    def invalidate_stats(self):
+        cache.delete(self.stats_key)
+
+    def _stats(self):
+        stats = cache.get(self.stats_key)
+        if stats is None:
+            stats = RecipeSearchTerm.objects.aggregate(
+                terms=Sum('frequency'),
+                documents=Count('recipe_id', distinct=True)
+            )
+            documents = stats['documents'] or 0
+            average_length = (stats['terms'] or 0) / (documents or 1)
+            stats = (documents, average_length or 1)
+            cache.set(
+                self.stats_key, stats, Constants.SEARCH_STATS_TIMEOUT
+            )
+        return stats
+
+    def search(self, query: str, limit: int = Constants.SEARCH_RESULTS_LIMIT):
+        """
+        Идентификаторы рецептов, отсортированные по убыванию
+        релевантности BM25.
+        """
+        terms = set(analyze(query))
+        if not terms:
+            return []
+        postings = list(RecipeSearchTerm.objects.filter(
+            term__in=terms
+        ).values_list('recipe_id', 'term', 'frequency', 'document_length'))
+        documents, average_length = self._stats()
+        document_frequency = Counter(term for _, term, _, _ in postings)
+        scores = defaultdict(float)
+        for recipe_id, term, frequency, length in postings:
+            found = document_frequency[term]
+            total = max(documents, found)
+            idf = math.log(1 + (total - found + 0.5) / (found + 0.5))
+            scores[recipe_id] += idf * frequency * (self.k1 + 1) / (
+                frequency + self.k1 * (
+                    1 - self.b + self.b * length / average_length
+                )
+            )
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [recipe_id for recipe_id, _ in best]
+
+
+recipe_search_index = RecipeSearchIndex()
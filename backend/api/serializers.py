@@ -1,6 +1,14 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
-from api.fields import Base64ImageField
+from api.conditional import get_versions
+from api.fields import Base64ImageField, ImageVariantsField
+from api.images import normalize_executor, normalize_image, read_dimensions
+from api.search import recipe_search_index
+from api.services import refresh_recipe_in_shopping_lists
+from foodgram.constants import Constants
 from recipes.models import (
     Cart,
     FavoritRecipe,
@@ -59,13 +67,27 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Представление списка рецептов с общей частью из кеша.
+    """
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.to_representation_many(list(recipes))
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     """
     Представление рецептов.
+    Не зависящая от пользователя часть кешируется по версии рецепта,
+    тегов, ингредиентов и профилей авторов, флаги пользователя
+    и часто меняющиеся счетчики добавляются при каждом ответе.
     """
     tags = TagSerializer(many=True, read_only=True)
     author = UserReadSerializer(read_only=True)
     image = Base64ImageField(required=True)
+    image_variants = ImageVariantsField()
     ingredients = RecipeIngredientReadSerializer(
         many=True,
         source='recipe_ingredient'
@@ -84,21 +106,124 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+
+    shared_version_keys = ('tag', 'ingredient')
+    prefetch_lookups = (
+        'tags',
+        Prefetch(
+            'recipe_ingredient',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    )
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
 
-    def get_extra_field(self, obj, model):
+    def to_representation_many(self, recipes):
+        shared = self.get_shared_representations(recipes)
+        return [
+            self.personalize(shared[recipe.id], recipe) for recipe in recipes
+        ]
+
+    def get_shared_representations(self, recipes):
+        """
+        Общая часть представлений: один запрос версий и один к кешу.
+        Ключ кеша зависит от версий рецепта и профиля его автора.
+        """
+        versions = get_versions(
+            [f'recipe:{recipe.id}' for recipe in recipes]
+            + [f'user:{recipe.author_id}' for recipe in recipes]
+            + list(self.shared_version_keys)
+        )
+        suffix = ':'.join(
+            str(versions[key]) for key in self.shared_version_keys
+        )
+        cache_keys = {
+            recipe.id: (
+                f'recipe-representation:{recipe.id}:'
+                f'{versions[f"recipe:{recipe.id}"]}:'
+                f'{versions[f"user:{recipe.author_id}"]}:{suffix}'
+            ) for recipe in recipes
+        }
+        cached = cache.get_many(cache_keys.values())
+        missing = [
+            recipe for recipe in recipes if cache_keys[recipe.id] not in cached
+        ]
+        if missing:
+            prefetch_related_objects(missing, *self.prefetch_lookups)
+            fresh = {
+                cache_keys[recipe.id]: self.get_shared_representation(recipe)
+                for recipe in missing
+            }
+            cache.set_many(fresh, Constants.RECIPE_CACHE_TIMEOUT)
+            cached.update(fresh)
+        return {
+            recipe_id: cached[key] for recipe_id, key in cache_keys.items()
+        }
+
+    def get_shared_representation(self, instance):
+        representation = super().to_representation(instance)
+        representation['is_favorited'] = False
+        representation['is_in_shopping_cart'] = False
+        representation['author']['is_subscribed'] = False
+        representation['image'] = (
+            instance.image.url if instance.image else None
+        )
+        representation['image_variants'] = (
+            self.fields['image_variants'].get_variants(instance)
+        )
+        return representation
+
+    def personalize(self, shared, instance):
+        """Добавление флагов текущего пользователя и счетчиков."""
+        representation = dict(shared)
+        representation['author'] = dict(
+            shared['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                instance.author
+            )
+        )
+        representation['is_favorited'] = self.get_is_favorited(instance)
+        representation['is_in_shopping_cart'] = (
+            self.get_is_in_shopping_cart(instance)
+        )
+        request = self.context.get('request')
+        if request and representation['image']:
+            representation['image'] = request.build_absolute_uri(
+                representation['image']
+            )
+        representation['image_variants'] = (
+            self.fields['image_variants'].make_absolute(
+                shared['image_variants'], request
+            )
+        )
+        representation['favorites_count'] = instance.favorites_count
+        representation['cart_count'] = instance.cart_count
+        return representation
+
+    def get_extra_field(self, obj, model, field_name):
+        annotated = getattr(obj, field_name, None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
         return model.objects.filter(recipe=obj, user=request.user).exists()
 
     def get_is_favorited(self, obj):
-        return self.get_extra_field(obj=obj, model=FavoritRecipe)
+        return self.get_extra_field(
+            obj=obj, model=FavoritRecipe, field_name='is_favorited'
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        return self.get_extra_field(obj=obj, model=Cart)
+        return self.get_extra_field(
+            obj=obj, model=Cart, field_name='is_in_shopping_cart'
+        )
 
 
 class RecipeCreateSerializer(RecipeReadSerializer):
@@ -146,6 +271,43 @@ class RecipeCreateSerializer(RecipeReadSerializer):
             )
         return ingredients
 
+    def validate_image(self, image):
+        """
+        Проверка размеров по заголовку файла.
+        Нормализация запускается в пуле потоков и выполняется
+        параллельно с проверкой остальных полей.
+        """
+        try:
+            width, height = read_dimensions(image)
+        except (OSError, ValueError):
+            raise serializers.ValidationError(
+                'Не удалось прочитать изображение.'
+            )
+        if width * height > Constants.MAX_IMAGE_PIXELS:
+            raise serializers.ValidationError(
+                f'Изображение больше {Constants.MAX_IMAGE_PIXELS} пикселей.'
+            )
+        self._normalized_image = normalize_executor.submit(
+            normalize_image, image
+        )
+        return image
+
+    def save(self, **kwargs):
+        upload = self.validated_data.get('image')
+        try:
+            future = getattr(self, '_normalized_image', None)
+            if future is not None:
+                try:
+                    self.validated_data['image'] = future.result()
+                except (OSError, ValueError):
+                    raise serializers.ValidationError(
+                        {'image': 'Не удалось обработать изображение.'}
+                    )
+            return super().save(**kwargs)
+        finally:
+            if upload:
+                upload.close()
+
     def add_ingredients(self, recipe, ingredients):
         ingredients.sort(key=lambda x: x['id'].name)
         ingredients = [
@@ -157,14 +319,17 @@ class RecipeCreateSerializer(RecipeReadSerializer):
         ]
         RecipeIngredient.objects.bulk_create(ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
-        recipe.tags.set(tags)
         self.add_ingredients(recipe=recipe, ingredients=ingredients)
+        recipe.tags.set(tags)
+        recipe_search_index.update(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance: Recipe, validated_data: dict):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
@@ -174,12 +339,23 @@ class RecipeCreateSerializer(RecipeReadSerializer):
         else:
             raise serializers.ValidationError({'tags': 'Не указаны.'})
         if ingredients:
+            old_ingredient_ids = set(instance.recipe_ingredient.values_list(
+                'ingredient_id', flat=True
+            ))
             instance.ingredients.clear()
             RecipeIngredient.objects.filter(recipe=instance).delete()
             self.add_ingredients(recipe=instance, ingredients=ingredients)
+            refresh_recipe_in_shopping_lists(
+                instance,
+                old_ingredient_ids | {
+                    ingredient['id'].id for ingredient in ingredients
+                }
+            )
         else:
             raise serializers.ValidationError({'ingredients': 'Не указаны.'})
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        recipe_search_index.update(instance)
+        return instance
 
     def to_representation(self, instance: Recipe):
         serializer = RecipeReadSerializer(instance)
@@ -200,6 +376,7 @@ class FavoritesSerializer(serializers.ModelSerializer):
         source='recipe.image',
         read_only=True
     )
+    image_variants = ImageVariantsField(source='recipe')
     cooking_time = serializers.IntegerField(
         source='recipe.cooking_time',
         read_only=True
@@ -207,7 +384,7 @@ class FavoritesSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = FavoritRecipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('name', 'cooking_time', 'image')
 
 
@@ -217,3 +394,16 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = ("id",)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для массового добавления и удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=Constants.MAX_BULK_IDS
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
@@ -1,7 +1,150 @@
+import csv
+import json
+from collections import defaultdict
+from functools import lru_cache
+
 from art import text2art
-from django.db.models import Sum
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from recipes.models import (Cart, FavoritRecipe, Recipe, RecipeIngredient,
+                            ShoppingListItem)
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {
+    FavoritRecipe: 'favorites_count',
+    Cart: 'cart_count',
+}
+
+
+@lru_cache(maxsize=None)
+def get_banner():
+    """Заголовок списка покупок, формируется один раз за процесс."""
+    return text2art('Foodgram\n\n', font='small')
+
+
+def update_counters(model, field: str, deltas: dict):
+    """
+    Изменение счетчиков выражением F() в текущей транзакции.
+    deltas: изменение счетчика для каждого id объекта.
+    Счетчик не опускается ниже нуля.
+    """
+    ids_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            ids_by_delta[delta].append(pk)
+    for delta, ids in ids_by_delta.items():
+        model.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def add_user_recipes(model, user_id: int, recipe_ids):
+    """
+    Добавление существующих рецептов в избранное или список покупок
+    одним INSERT ... SELECT с пропуском уже добавленных.
+    Возвращает id рецептов, строки которых действительно вставлены.
+    """
+    quote = connection.ops.quote_name
+    columns = [
+        model._meta.get_field(name).column
+        for name in ('user', 'recipe', 'added_date')
+    ]
+    added_date = model._meta.get_field('added_date').get_db_prep_value(
+        timezone.now(), connection
+    )
+    recipe_id = quote(Recipe._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({", ".join(quote(column) for column in columns)}) '
+            f'SELECT %s, {recipe_id}, %s '
+            f'FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {recipe_id} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(columns[1])}',
+            [user_id, added_date, *recipe_ids]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_shopping_list_totals(user_ids, ingredient_ids=None):
+    """
+    Суммы ингредиентов по рецептам в списках покупок пользователей.
+    """
+    totals = RecipeIngredient.objects.filter(
+        recipe__shop_list__user_id__in=user_ids
+    )
+    if ingredient_ids is not None:
+        totals = totals.filter(ingredient_id__in=ingredient_ids)
+    return totals.values(
+        'recipe__shop_list__user_id', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by()
+
+
+def refresh_shopping_lists(user_ids, ingredient_ids=None):
+    """
+    Пересчет сумм списков покупок пользователей.
+    Если переданы ингредиенты, пересчитываются только они.
+    Строки пользователей блокируются, поэтому параллельные пересчеты
+    одного списка выполняются по очереди и видят изменения друг друга.
+    FOR NO KEY UPDATE не конфликтует с блокировками внешних ключей
+    от вставки в список покупок.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+    if ingredient_ids is not None:
+        ingredient_ids = list(ingredient_ids)
+        items = items.filter(ingredient_id__in=ingredient_ids)
+    with transaction.atomic():
+        list(User.objects.select_for_update(no_key=True).filter(
+            id__in=user_ids
+        ).order_by('id').values_list('id', flat=True))
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=row['recipe__shop_list__user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total']
+            ) for row in get_shopping_list_totals(user_ids, ingredient_ids)
+        )
+
+
+def refresh_recipes_in_shopping_list(user_id, recipe_ids):
+    """
+    Пересчет ингредиентов рецептов, добавленных в список покупок
+    пользователя или удаленных из него.
+    """
+    refresh_shopping_lists(
+        [user_id],
+        RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', flat=True)
+    )
+
+
+def refresh_recipe_in_shopping_lists(recipe, ingredient_ids):
+    """
+    Пересчет списков покупок, в которых есть рецепт,
+    после изменения его ингредиентов.
+    """
+    refresh_shopping_lists(
+        recipe.shop_list.values_list('user_id', flat=True),
+        ingredient_ids
+    )
 
-from recipes.models import RecipeIngredient
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
 
 
 class ShoppingListCreator:
@@ -9,43 +152,83 @@ class ShoppingListCreator:
     Создание списка покупок.
     """
 
+    formats = {
+        'txt': ('text/plain; charset=utf-8', 'txt'),
+        'csv': ('text/csv; charset=utf-8', 'csv'),
+        'json': ('application/json', 'json'),
+    }
+
     def __init__(self, user):
         self.user = user
 
     def __get_data(self):
         """
-        Получение ингредиентов и суммирование количества дублей.
+        Получение ингредиентов с суммарным количеством.
         """
-        shopping_list_data = RecipeIngredient.objects.filter(
-            recipe__shop_list__user=self.user
+        shopping_list_data = ShoppingListItem.objects.filter(
+            user=self.user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            sum_amount=Sum(
-                'amount',
-                distinct=True
-            )
-        )
-        return shopping_list_data
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name')
+        return shopping_list_data.iterator()
 
     def create_shopping_list(self):
         """
-        Создание списка покупок.
+        Создание списка покупок построчно.
         """
-        data = self.__get_data()
         separator = '-'
         base_len_separator = 35
-        shop_list = text2art('Foodgram\n\n', font='small')
-        shop_list += f'Список покупок для @{self.user.username}.\n\n'
-        for item in data:
+        yield get_banner()
+        yield f'Список покупок для @{self.user.username}.\n\n'
+        for item in self.__get_data():
             item_len_separator = (
                 base_len_separator - len(item["ingredient__name"])
             )
-            shop_list += (
+            yield (
                 f'◻︎ {item["ingredient__name"]} '
                 f'{separator * item_len_separator} '
-                f'{item["sum_amount"]} '
+                f'{item["amount"]} '
                 f'{item["ingredient__measurement_unit"]}\n'
             )
-        return shop_list
+
+    def create_csv(self):
+        """
+        Создание списка покупок в формате csv построчно.
+        """
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in self.__get_data():
+            yield writer.writerow((
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['amount'],
+            ))
+
+    def create_json(self):
+        """
+        Создание списка покупок в формате json по частям.
+        """
+        yield '{"user": %s, "ingredients": [' % json.dumps(
+            self.user.username
+        )
+        for number, item in enumerate(self.__get_data()):
+            yield (',' if number else '') + json.dumps({
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['amount'],
+            }, ensure_ascii=False)
+        yield ']}'
+
+    def stream(self, file_format='txt'):
+        """
+        Генератор содержимого, тип содержимого и расширение файла.
+        """
+        content_type, extension = self.formats[file_format]
+        generator = {
+            'txt': self.create_shopping_list,
+            'csv': self.create_csv,
+            'json': self.create_json,
+        }[file_format]
+        return generator(), content_type, extension
@@ -0,0 +1,228 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.conditional import bump_version, bump_versions
+from api.feed import backfill, fan_out
+from api.images import schedule_variants
+from api.indexes import ingredient_index, tag_catalog
+from api.search import recipe_search_index
+from api.services import (RECIPE_COUNTERS, refresh_recipes_in_shopping_list,
+                          refresh_shopping_lists, update_counters)
+from recipes.models import (Cart, FavoritRecipe, Ingredient, Recipe,
+                            RecipeIngredient, RecipeNeighbor, Tag,
+                            TimelineEntry)
+from users.models import Subscription
+
+User = get_user_model()
+
+muted_senders = ContextVar('muted_senders', default=frozenset())
+
+
+@contextmanager
+def mute_receivers(*senders):
+    """
+    Отключение построчных обработчиков для моделей senders в текущем
+    потоке. Массовые операции выполняют их действия сами, один раз
+    для всех строк. Другие запросы продолжают получать сигналы.
+    """
+    token = muted_senders.set(muted_senders.get() | set(senders))
+    try:
+        yield
+    finally:
+        muted_senders.reset(token)
+
+
+def unless_muted(handler):
+    @wraps(handler)
+    def wrapper(sender, **kwargs):
+        if sender not in muted_senders.get():
+            return handler(sender=sender, **kwargs)
+    return wrapper
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сброс индекса ингредиентов при изменении ингредиентов."""
+    ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_search_stats(**kwargs):
+    """Сброс статистики поискового индекса при удалении рецепта."""
+    recipe_search_index.invalidate_stats()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tag_version(**kwargs):
+    bump_version('tag')
+    tag_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredient_version(**kwargs):
+    bump_version('ingredient')
+
+
+@receiver(pre_delete, sender=Recipe)
+def bump_neighbors_version(instance, **kwargs):
+    """
+    Рецепты, в списках соседей которых был удаляемый рецепт,
+    получают метку neighbors:<id>: каскадное удаление оставляет
+    их списки короче, buildsimilarrecipes пересчитает их.
+    """
+    bump_versions(
+        f'neighbors:{recipe_id}'
+        for recipe_id in RecipeNeighbor.objects.filter(
+            neighbor=instance
+        ).values_list('recipe_id', flat=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_recipe_version(instance, signal, **kwargs):
+    """
+    Версия рецепта для кеша и ETag. Версия состава ingredients:<id>
+    меняется только при изменении ингредиентов и удалении рецепта,
+    по ней обновляются индексы подбора рецептов.
+    """
+    if signal is post_delete:
+        bump_versions(
+            [f'recipe:{instance.pk}', f'ingredients:{instance.pk}']
+        )
+    else:
+        bump_version(f'recipe:{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def bump_recipe_ingredient_version(instance, **kwargs):
+    bump_versions(
+        [f'recipe:{instance.recipe_id}', f'ingredients:{instance.recipe_id}']
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(instance, action, reverse, pk_set, **kwargs):
+    """Версии рецепта и его набора тегов tags:<id>."""
+    if not action.startswith('post_'):
+        return
+    recipe_ids = pk_set or () if reverse else (instance.pk,)
+    bump_versions(
+        key for recipe_id in recipe_ids
+        for key in (f'recipe:{recipe_id}', f'tags:{recipe_id}')
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(instance, created, update_fields, **kwargs):
+    """
+    Профиль автора входит в представление его рецептов.
+    У нового пользователя рецептов еще нет.
+    """
+    if created or (
+        update_fields and set(update_fields) <= {'last_login', 'password'}
+    ):
+        return
+    bump_version(f'user:{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=FavoritRecipe)
+@receiver((post_save, post_delete), sender=Cart)
+@receiver((post_save, post_delete), sender=Subscription)
+@unless_muted
+def bump_user_flags_version(instance, **kwargs):
+    """Флаги избранного, покупок и подписок текущего пользователя."""
+    bump_version(f'flags:{instance.user_id}')
+
+
+@receiver(post_save, sender=Cart)
+@unless_muted
+def add_to_shopping_list(instance, created, **kwargs):
+    """Пересчет ингредиентов рецепта, добавленного в список покупок."""
+    if created:
+        refresh_recipes_in_shopping_list(
+            instance.user_id, [instance.recipe_id]
+        )
+
+
+@receiver(post_delete, sender=Cart)
+@unless_muted
+def remove_from_shopping_list(instance, **kwargs):
+    """
+    Пересчет списка покупок после удаления рецепта.
+    Ингредиенты рецепта могли быть удалены каскадно вместе с ним,
+    поэтому список пересчитывается целиком.
+    """
+    refresh_shopping_lists([instance.user_id])
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(instance, **kwargs):
+    """Создание вариантов нового изображения в фоне."""
+    schedule_variants(instance)
+
+
+def get_counter_delta(signal, created: bool) -> int:
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver((post_save, post_delete), sender=FavoritRecipe)
+@receiver((post_save, post_delete), sender=Cart)
+@unless_muted
+def update_recipe_counter(sender, instance, signal, created=False, **kwargs):
+    """
+    Счетчики добавлений рецепта в избранное и список покупок.
+    Метка counters:<id> меняет только ETag рецепта, кешированное
+    представление остается действительным.
+    """
+    delta = get_counter_delta(signal, created)
+    if delta:
+        update_counters(
+            Recipe, RECIPE_COUNTERS[sender], {instance.recipe_id: delta}
+        )
+        bump_version(f'counters:{instance.recipe_id}')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipes_count(instance, signal, created=False, **kwargs):
+    """Счетчик рецептов автора."""
+    update_counters(
+        User, 'recipes_count',
+        {instance.author_id: get_counter_delta(signal, created)}
+    )
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def update_followers_count(instance, signal, created=False, **kwargs):
+    """Счетчик подписчиков автора."""
+    update_counters(
+        User, 'followers_count',
+        {instance.following_id: get_counter_delta(signal, created)}
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def publish_to_timelines(instance, created, **kwargs):
+    """Новый рецепт попадает в ленты подписчиков автора."""
+    if created:
+        fan_out([instance])
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_timeline(instance, created, **kwargs):
+    if created:
+        backfill(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_timeline(instance, **kwargs):
+    TimelineEntry.objects.filter(
+        user_id=instance.user_id, author_id=instance.following_id
+    ).delete()
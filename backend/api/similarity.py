@@ -0,0 +1,193 @@
+"""
+Расчет похожих рецептов: косинусное сходство векторов
+ингредиентов и тегов на разреженных матрицах.
+Кандидаты в соседи — рецепты с общими ингредиентами,
+теги добавляются к сходству с весом SIMILARITY_TAG_WEIGHT.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from foodgram.constants import Constants
+from recipes.models import Recipe, RecipeIngredient, RecipeNeighbor
+
+_matrix = None
+
+
+def load_pairs(queryset, *fields):
+    """Пары значений из БД в массив numpy формы (n, 2)."""
+    values = np.fromiter(
+        chain.from_iterable(
+            queryset.order_by().values_list(*fields).iterator()
+        ),
+        dtype=np.int64
+    )
+    return values.reshape(-1, 2)
+
+
+def incidence(rows, features, shape_rows):
+    """Бинарная матрица рецептов и признаков."""
+    _, columns = np.unique(features, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)),
+        shape=(shape_rows, columns.max() + 1 if len(columns) else 0)
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+class FeatureMatrix:
+    """Матрицы ингредиентов и тегов всех рецептов."""
+
+    def __init__(self, max_df=Constants.SIMILARITY_MAX_DF,
+                 tag_weight=Constants.SIMILARITY_TAG_WEIGHT,
+                 min_documents=Constants.SIMILARITY_MIN_DOCUMENTS):
+        self.recipe_ids = np.fromiter(
+            Recipe.objects.order_by('id').values_list(
+                'id', flat=True
+            ).iterator(),
+            dtype=np.int64
+        )
+        size = len(self.recipe_ids)
+        ingredients = load_pairs(
+            RecipeIngredient.objects, 'recipe_id', 'ingredient_id'
+        )
+        tags = load_pairs(Recipe.tags.through.objects, 'recipe_id', 'tag_id')
+        self.ingredients = incidence(
+            self.rows(ingredients[:, 0]), ingredients[:, 1], size
+        )
+        # Слишком частые ингредиенты почти не различают рецепты,
+        # но дают огромное число кандидатов. В маленьком каталоге
+        # доля ничего не говорит о частоте, отсев только мешает.
+        if size >= min_documents:
+            frequency = np.asarray(self.ingredients.sum(axis=0)).ravel()
+            self.ingredients = self.ingredients[
+                :, np.flatnonzero(frequency <= max_df * size)
+            ].tocsr()
+        self.tags = incidence(self.rows(tags[:, 0]), tags[:, 1], size)
+        self.tag_weight = tag_weight ** 2
+        self.norms = np.sqrt(
+            np.asarray(self.ingredients.sum(axis=1)).ravel()
+            + self.tag_weight * np.asarray(self.tags.sum(axis=1)).ravel()
+        )
+        self.norms[self.norms == 0] = 1
+
+    def rows(self, recipe_ids):
+        """Номера строк матрицы для id рецептов."""
+        return np.searchsorted(self.recipe_ids, recipe_ids)
+
+    def scores(self, rows):
+        """
+        Сходство строк rows со всеми рецептами с общими ингредиентами.
+        Возвращает номера строк в rows, номера соседей и сходство.
+        """
+        dots = (self.ingredients[rows] @ self.ingredients.T).tocoo()
+        sources, neighbors = dots.row, dots.col
+        keep = rows[sources] != neighbors
+        sources, neighbors = sources[keep], neighbors[keep]
+        tag_dots = np.asarray(self.tags[rows[sources]].multiply(
+            self.tags[neighbors]
+        ).sum(axis=1)).ravel()
+        score = (dots.data[keep] + self.tag_weight * tag_dots) / (
+            self.norms[rows[sources]] * self.norms[neighbors]
+        )
+        return sources, neighbors, score
+
+
+def top_neighbors(matrix, rows, limit):
+    """Лучшие limit соседей для каждой строки из rows."""
+    sources, neighbors, score = matrix.scores(rows)
+    order = np.lexsort((-score, sources))
+    sources, neighbors, score = (
+        sources[order], neighbors[order], score[order]
+    )
+    starts = np.searchsorted(sources, np.arange(len(rows)))
+    keep = np.arange(len(sources)) - starts[sources] < limit
+    return (
+        matrix.recipe_ids[rows[sources[keep]]],
+        matrix.recipe_ids[neighbors[keep]],
+        score[keep]
+    )
+
+
+def init_worker(matrix):
+    global _matrix
+    _matrix = matrix
+
+
+def compute_block(rows, limit):
+    return top_neighbors(_matrix, rows, limit)
+
+
+def affected_rows(matrix, changed_ids, limit, stale_ids=()):
+    """
+    Строки, списки соседей которых могли измениться вместе
+    с рецептами changed_ids: сами рецепты, рецепты, у которых они
+    были соседями, и рецепты, в чьи списки они теперь попадают.
+    Рецепты stale_ids пересчитываются без поиска связанных.
+    """
+    changed = set(changed_ids)
+    changed_ids = np.array(
+        sorted(changed & set(matrix.recipe_ids.tolist())), dtype=np.int64
+    )
+    affected = changed | set(stale_ids) | set(RecipeNeighbor.objects.filter(
+        neighbor_id__in=changed
+    ).values_list('recipe_id', flat=True))
+    if len(changed_ids):
+        _, neighbors, score = matrix.scores(matrix.rows(changed_ids))
+        best = {}
+        for neighbor_id, value in zip(
+            matrix.recipe_ids[neighbors].tolist(), score.tolist()
+        ):
+            best[neighbor_id] = max(value, best.get(neighbor_id, 0))
+        thresholds = {
+            row['recipe_id']: row['lowest'] if row['total'] >= limit else 0
+            for row in RecipeNeighbor.objects.filter(
+                recipe_id__in=best
+            ).values('recipe_id').annotate(
+                lowest=Min('score'), total=Count('id')
+            ).order_by()
+        }
+        affected.update(
+            neighbor_id for neighbor_id, value in best.items()
+            if value > thresholds.get(neighbor_id, 0)
+        )
+    return matrix.rows(np.array(
+        sorted(affected & set(matrix.recipe_ids.tolist())), dtype=np.int64
+    ))
+
+
+@transaction.atomic
+def store(recipe_ids, sources, neighbors, scores):
+    """Замена списков соседей рецептов recipe_ids."""
+    RecipeNeighbor.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeNeighbor.objects.bulk_create(
+        RecipeNeighbor(recipe_id=source, neighbor_id=neighbor, score=score)
+        for source, neighbor, score in zip(
+            sources.tolist(), neighbors.tolist(), scores.tolist()
+        )
+    )
+
+
+def build(matrix, rows, workers, block_size=Constants.SIMILARITY_BLOCK_SIZE,
+          limit=Constants.SIMILAR_RECIPES_LIMIT):
+    """
+    Расчет соседей для строк rows блоками в пуле процессов.
+    Возвращает число обработанных рецептов.
+    """
+    blocks = [
+        rows[start:start + block_size]
+        for start in range(0, len(rows), block_size)
+    ]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(matrix,)
+    ) as pool:
+        results = pool.map(compute_block, blocks, [limit] * len(blocks))
+        for block, result in zip(blocks, results):
+            store(matrix.recipe_ids[block].tolist(), *result)
+    return len(rows)
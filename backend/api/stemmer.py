@@ -0,0 +1,118 @@
+"""
+Стеммер русского языка по алгоритму Snowball (Porter).
+http://snowball.tartarus.org/algorithms/russian/stemmer.html
+"""
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    (('в', 'вши', 'вшись'), True),
+    (('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'), False),
+)
+ADJECTIVE = ((
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+    False
+),)
+PARTICIPLE = (
+    (('ем', 'нн', 'вш', 'ющ', 'щ'), True),
+    (('ивш', 'ывш', 'ующ'), False),
+)
+REFLEXIVE = ((('ся', 'сь'), False),)
+VERB = (
+    (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+      'ют', 'ны', 'ть', 'ешь', 'нно'), True),
+    (('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+      'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+      'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'), False),
+)
+NOUN = ((
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+     'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+     'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'),
+    False
+),)
+DERIVATIONAL = ((('ост', 'ость'), False),)
+SUPERLATIVE = ((('ейш', 'ейше'), False),)
+
+
+def _regions(word: str):
+    """Начало областей RV и R2 в слове."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _remove_ending(region: str, groups):
+    """
+    Удаление самого длинного окончания из группы.
+    Для окончаний первой группы требуется предшествующая «а» или «я».
+    Возвращает None, если окончание не найдено или условие не выполнено.
+    """
+    best, needs_a_ya = '', False
+    for endings, condition in groups:
+        for ending in endings:
+            if len(ending) > len(best) and region.endswith(ending):
+                best, needs_a_ya = ending, condition
+    if not best:
+        return None
+    stem = region[:-len(best)]
+    if needs_a_ya and not stem.endswith(('а', 'я')):
+        return None
+    return stem
+
+
+def _step_one(rv: str) -> str:
+    stem = _remove_ending(rv, PERFECTIVE_GERUND)
+    if stem is not None:
+        return stem
+    reflexive = _remove_ending(rv, REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    stem = _remove_ending(rv, ADJECTIVE)
+    if stem is not None:
+        participle = _remove_ending(stem, PARTICIPLE)
+        return stem if participle is None else participle
+    for groups in (VERB, NOUN):
+        stem = _remove_ending(rv, groups)
+        if stem is not None:
+            return stem
+    return rv
+
+
+def _tidy_up(rv: str) -> str:
+    stem = _remove_ending(rv, SUPERLATIVE)
+    if stem is not None:
+        return stem[:-1] if stem.endswith('нн') else stem
+    if rv.endswith('нн'):
+        return rv[:-1]
+    if rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+def stem(word: str) -> str:
+    """Основа слова в нижнем регистре."""
+    word = word.lower().replace('ё', 'е')
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+    rv = _step_one(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    r2_offset = max(r2_start - rv_start, 0)
+    derivational = _remove_ending(rv[r2_offset:], DERIVATIONAL)
+    if derivational is not None:
+        rv = rv[:r2_offset] + derivational
+    return prefix + _tidy_up(rv)
@@ -0,0 +1,201 @@
+import threading
+from collections import Counter
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from recipes.models import (Cart, FavoritRecipe, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+THREADS = 8
+
+
+class ConcurrentToggleTests(TransactionTestCase):
+    """
+    Одновременные добавления и удаления рецептов и подписок:
+    ровно один запрос выполняется, остальные получают 400.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Reader', password='Pass-12345'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='Pass-12345'
+        )
+        ingredient = Ingredient.objects.create(
+            name='Морковь', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', text='Суп', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=100
+        )
+
+    def hammer(self, method, url):
+        """Одновременные запросы из THREADS потоков, коды ответов."""
+        barrier = threading.Barrier(THREADS)
+        codes = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                codes.append(getattr(client, method)(url).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return Counter(codes)
+
+    def assert_one_succeeded(self, codes, success):
+        self.assertEqual(codes, Counter({
+            success: 1, status.HTTP_400_BAD_REQUEST: THREADS - 1
+        }))
+
+    def check_recipe_toggle(self, model, url, counter):
+        self.assert_one_succeeded(
+            self.hammer('post', url), status.HTTP_201_CREATED
+        )
+        self.assertEqual(
+            model.objects.filter(user=self.user, recipe=self.recipe).count(),
+            1
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, counter), 1)
+        self.assert_one_succeeded(
+            self.hammer('delete', url), status.HTTP_204_NO_CONTENT
+        )
+        self.assertFalse(
+            model.objects.filter(user=self.user, recipe=self.recipe).exists()
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, counter), 0)
+
+    def test_favorite(self):
+        self.check_recipe_toggle(
+            FavoritRecipe,
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            'favorites_count'
+        )
+
+    def test_shopping_cart(self):
+        self.check_recipe_toggle(
+            Cart,
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            'cart_count'
+        )
+        self.assertFalse(self.user.shopping_list_items.exists())
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assert_one_succeeded(
+            self.hammer('post', url), status.HTTP_201_CREATED
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assert_one_succeeded(
+            self.hammer('delete', url), status.HTTP_204_NO_CONTENT
+        )
+        self.assertFalse(Subscription.objects.exists())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+
+class ShoppingListTotalsTests(TestCase):
+    """
+    Суммы ингредиентов списка покупок после добавления и удаления
+    рецептов и изменения их состава.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com',
+            first_name='Buyer', last_name='Buyer', password='Pass-12345'
+        )
+        cls.tag = Tag.objects.create(
+            name='Обед', color='#000000', slug='lunch'
+        )
+        cls.carrot, cls.onion = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Морковь', 'Лук')
+        )
+        cls.soup, cls.salad = (
+            Recipe.objects.create(
+                author=cls.user, name=name, text=name, cooking_time=10
+            ) for name in ('Суп', 'Салат')
+        )
+        for recipe in (cls.soup, cls.salad):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.carrot, amount=100
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def totals(self):
+        return dict(self.user.shopping_list_items.values_list(
+            'ingredient__name', 'amount'
+        ))
+
+    def add(self, recipe):
+        self.assertEqual(
+            self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            ).status_code,
+            status.HTTP_201_CREATED
+        )
+
+    def assert_no_drift(self):
+        output = StringIO()
+        call_command('rebuildshoppinglists', '--check', stdout=output)
+        self.assertIn('с расхождениями: 0', output.getvalue())
+
+    def test_same_ingredient_in_two_recipes(self):
+        self.add(self.soup)
+        self.add(self.salad)
+        self.assertEqual(self.totals(), {'Морковь': 200})
+        self.assert_no_drift()
+
+    def test_add_remove_and_edit(self):
+        self.add(self.soup)
+        self.add(self.salad)
+        self.assertEqual(
+            self.client.delete(
+                f'/api/recipes/{self.salad.id}/shopping_cart/'
+            ).status_code,
+            status.HTTP_204_NO_CONTENT
+        )
+        self.assertEqual(self.totals(), {'Морковь': 100})
+        response = self.client.patch(
+            f'/api/recipes/{self.soup.id}/',
+            {
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': self.carrot.id, 'amount': 250},
+                    {'id': self.onion.id, 'amount': 50},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.totals(), {'Морковь': 250, 'Лук': 50})
+        self.assert_no_drift()
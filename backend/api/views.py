@@ -1,31 +1,44 @@
 
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import IngredientSearchFilter, RecipeFilter
-from api.pagination import Pagination
+from api.conditional import ConditionalGetMixin, bump_versions
+from api.filters import (AliasOrderingFilter, IngredientSearchFilter,
+                         RecipeFilter)
+from api.feed import get_feed_sources
+from api.pagination import FeedPagination, Pagination
+from api.parsers import LimitedJSONParser, StreamingMultiPartParser
+from api.renderers import CSVRenderer, PlainTextRenderer
 from api.serializers import (CartSerializer, FavoritesSerializer,
                              IngredientSerializer, RecipeCreateSerializer,
-                             RecipeReadSerializer, TagSerializer)
-from api.services import ShoppingListCreator
+                             RecipeIdsSerializer, RecipeReadSerializer,
+                             TagSerializer)
+from api.services import (RECIPE_COUNTERS, ShoppingListCreator,
+                          add_user_recipes, refresh_recipes_in_shopping_list,
+                          update_counters)
+from api.signals import mute_receivers
+from foodgram.constants import Constants
 from recipes.models import Cart, FavoritRecipe, Ingredient, Recipe, Tag
 from users.permissions import IsAuthorOrAdminOrHigherOrReadOnly
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    version_keys = ('tag',)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для представления ингредиентов.
     """
@@ -33,18 +46,41 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     filter_backends = [IngredientSearchFilter, ]
     search_fields = ('^name',)
+    version_keys = ('ingredient',)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Вьюсет для представления, создания, редактирования и удаления рецептов.
     """
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrAdminOrHigherOrReadOnly,
                           IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, ]
+    filter_backends = [DjangoFilterBackend, AliasOrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'cart_count', 'trending')
+    ordering_aliases = {'trending': '-trending_score'}
     pagination_class = Pagination
+    parser_classes = [LimitedJSONParser, StreamingMultiPartParser]
+    conditional_actions = ('retrieve',)
+
+    def get_version_keys(self):
+        try:
+            author_id = Recipe.objects.filter(
+                pk=self.kwargs['pk']
+            ).values_list('author_id', flat=True).first()
+        except (TypeError, ValueError):
+            author_id = None
+        keys = [
+            f'recipe:{self.kwargs["pk"]}', f'counters:{self.kwargs["pk"]}',
+            f'user:{author_id}', 'tag', 'ingredient'
+        ]
+        if self.request.user.is_authenticated:
+            keys.append(f'flags:{self.request.user.id}')
+        return keys
+
+    def get_validator_extra(self):
+        return (*super().get_validator_extra(), self.request.user.id)
 
     def update(self, request: Request, *args, **kwargs):
         if request.method == 'PUT':
@@ -52,13 +88,22 @@ class RecipeViewSet(ModelViewSet):
                             data={'detail': 'Метод "PUT" не разрешен.'})
         return super().update(request, *args, **kwargs)
 
+    def get_queryset(self):
+        if self.action not in ['list', 'retrieve', 'similar']:
+            return super().get_queryset()
+        return Recipe.objects.with_user_flags(
+            self.request.user
+        ).select_related('author')
+
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed', 'similar']:
             return RecipeReadSerializer
         elif self.action == 'favorite':
             return FavoritesSerializer
         elif self.action == 'shopping_cart':
             return CartSerializer
+        elif self.action in ('bulk_favorite', 'bulk_shopping_cart'):
+            return RecipeIdsSerializer
         return RecipeCreateSerializer
 
     def perform_create(self, serializer: RecipeCreateSerializer):
@@ -69,47 +114,153 @@ class RecipeViewSet(ModelViewSet):
     def __post_extra_action(self, request: Request, model, pk: int):
         """
         Добавление рецепта в список покупок/избранное.
+        Повторное добавление отсекается ограничением уникальности в БД.
         """
-        if Recipe.objects.filter(id=pk).exists():
-            user = request.user
-            recipe: Recipe = Recipe.objects.get(id=pk)
-            object_exists: bool = model.objects.filter(
-                user=user,
-                recipe=recipe
-            ).exists()
-            if object_exists:
-                return Response(
-                    {'errors': 'Выбранный рецепт уже добавлен.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=user, recipe=recipe)
+        recipe = Recipe.objects.filter(id=pk).first()
+        if recipe is None:
+            return Response(
+                {'errors': 'Выбранный рецепт не существует.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                serializer.save(user=request.user, recipe=recipe)
+        except IntegrityError:
             return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED)
+                {'errors': 'Выбранный рецепт уже добавлен.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(
-            {'errors': 'Выбранный рецепт не существует.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+            serializer.data,
+            status=status.HTTP_201_CREATED)
 
     @staticmethod
     def __delete_extra_action(request: Request, model, pk: int):
         """
         Удаление рецепта из списка покупок/избранного.
         """
+        deleted, _ = model.objects.filter(
+            user=request.user,
+            recipe_id=pk
+        ).delete()
+        if deleted:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=pk)
+        return Response(
+            data={'errors': 'Выбранный рецепт ранее не был добавлен.'},
+            status=status.HTTP_400_BAD_REQUEST)
+
+    def __bulk_extra_action(self, request: Request, model):
+        """
+        Массовое добавление рецептов в список покупок/избранное
+        или удаление из него. Возвращает результат для каждого id.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
         user = request.user
-        recipe: Recipe = get_object_or_404(Recipe, id=pk)
-        object_exists: bool = model.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists()
-        if not object_exists:
-            return Response(
-                data={'errors': 'Выбранный рецепт ранее не был добавлен.'},
-                status=status.HTTP_400_BAD_REQUEST)
-        model.objects.get(user=user, recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        existing = set(Recipe.objects.filter(
+            id__in=ids
+        ).values_list('id', flat=True))
+        # Изменения считаются по строкам, которые действительно вставлены
+        # или удалены, поэтому параллельные одиночные запросы не приводят
+        # к двойному изменению счетчиков. Построчные сигналы отключены:
+        # их действия выполняются ниже один раз для всех рецептов.
+        with transaction.atomic(), mute_receivers(model):
+            if request.method == 'POST':
+                changed = add_user_recipes(model, user.id, ids)
+                outcomes, delta = ('added', 'exists'), 1
+            else:
+                user_objects = model.objects.filter(
+                    user=user, recipe_id__in=ids
+                )
+                changed = list(user_objects.select_for_update().values_list(
+                    'recipe_id', flat=True
+                ))
+                user_objects.filter(recipe_id__in=changed).delete()
+                outcomes, delta = ('removed', 'not_added'), -1
+            if changed:
+                update_counters(
+                    Recipe, RECIPE_COUNTERS[model],
+                    dict.fromkeys(changed, delta)
+                )
+                bump_versions(
+                    [f'flags:{user.id}']
+                    + [f'counters:{pk}' for pk in changed]
+                )
+                if model is Cart:
+                    refresh_recipes_in_shopping_list(user.id, changed)
+        changed = set(changed)
+        return Response({'results': [
+            {'id': pk,
+             'status': outcomes[0] if pk in changed
+             else outcomes[1] if pk in existing else 'not_found'}
+            for pk in ids
+        ]})
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, ]
+    )
+    def feed(self, request: Request):
+        """
+        Рецепты авторов, на которых подписан пользователь,
+        от новых к старым. Пагинация по курсору.
+        """
+        user = request.user
+        paginator = FeedPagination()
+        ids = paginator.paginate_sources(get_feed_sources(user), request)
+        recipes = Recipe.objects.with_user_flags(user).select_related(
+            'author'
+        ).in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request: Request, pk: int):
+        """
+        Похожие рецепты из таблицы соседей,
+        которую заполняет команда buildsimilarrecipes.
+        """
+        recipes = self.get_queryset().filter(
+            neighbor_of__recipe_id=pk
+        ).order_by('-neighbor_of__score')[:Constants.SIMILAR_RECIPES_LIMIT]
+        serializer = self.get_serializer(recipes, many=True)
+        data = serializer.data
+        if not data:
+            get_object_or_404(Recipe, id=pk)
+        return Response(data)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def bulk_favorite(self, request: Request):
+        """
+        Добавить в избранное или удалить из него несколько рецептов.
+        """
+        return self.__bulk_extra_action(request=request, model=FavoritRecipe)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def bulk_shopping_cart(self, request: Request):
+        """
+        Добавить в список покупок или удалить из него несколько рецептов.
+        """
+        return self.__bulk_extra_action(request=request, model=Cart)
 
     @action(
         detail=True,
@@ -165,20 +316,25 @@ class RecipeViewSet(ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[IsAuthenticated, ]
+        permission_classes=[IsAuthenticated, ],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer]
     )
     def download_shopping_cart(self, request: Request):
         """
-        Получить список покупок в формате .txt.
+        Получить список покупок в формате .txt, .csv или .json
+        (параметр format).
         """
         user = request.user
         if user.shop_list.exists():
-            shopping_list = ShoppingListCreator(
+            content, content_type, extension = ShoppingListCreator(
                 user=user
-            ).create_shopping_list()
-            response = HttpResponse(shopping_list, content_type='text/plain')
+            ).stream(request.accepted_renderer.format)
+            response = StreamingHttpResponse(
+                content, content_type=content_type
+            )
             response['Content-Disposition'] = (
-                f'attachment; filename={user.username}_shopping_list.txt'
+                f'attachment; filename={user.username}_shopping_list.'
+                f'{extension}'
             )
             return response
 
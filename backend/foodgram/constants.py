@@ -14,3 +14,45 @@ class Constants:
     MAX_COOKING_TIME: int = 1000
     MIN_AMOUNT: int = 1
     MAX_AMOUNT: int = 10000
+    INGREDIENT_INDEX_TTL: int = 300  # секунд до перестроения индекса
+    TAG_CATALOG_TTL: int = 300  # секунд до перечитывания тегов
+    FUZZY_SEARCH_LIMIT: int = 10
+    FUZZY_SEARCH_THRESHOLD: float = 0.3  # минимальная доля общих триграмм
+    MAX_TERM_LENGTH: int = 64
+    SEARCH_NAME_WEIGHT: int = 3  # вес слов из названия рецепта
+    SEARCH_RESULTS_LIMIT: int = 500
+    SEARCH_STATS_TIMEOUT: int = 300
+    SEARCH_INDEX_BATCH_SIZE: int = 500
+    COVERAGE_INDEX_TTL: int = 60 * 60  # секунд до перестроения индекса
+    COVERAGE_OVERLAY_LIMIT: int = 10000  # изменений до перестроения
+    COVERAGE_SYNC_MARGIN: int = 60  # секунд повторного чтения изменений
+    COVERAGE_RESULTS_LIMIT: int = 500
+    COVERAGE_CANDIDATES_LIMIT: int = 10000  # проверяемых фильтрами
+    RECIPE_CACHE_TIMEOUT: int = 60 * 60
+    SHOPPING_LIST_BATCH_SIZE: int = 500
+    MAX_IMAGE_SIZE: int = 10 * 1024 * 1024
+    MAX_FORM_DATA_SIZE: int = 1024 * 1024
+    IMAGE_VARIANT_WIDTHS: tuple = (('thumbnail', 320), ('medium', 960))
+    IMAGE_VARIANT_QUALITY: int = 80
+    IMAGE_WORKERS: int = 2
+    IMAGE_NORMALIZE_WORKERS: int = 4
+    MAX_IMAGE_PIXELS: int = 50_000_000
+    MAX_IMAGE_SIDE: int = 2048
+    IMAGE_SIZE_BUDGET: int = 512 * 1024
+    IMAGE_QUALITY_STEPS: tuple = (85, 75, 65, 55)
+    RECIPE_TRANSFER_BATCH_SIZE: int = 500
+    CSV_BATCH_SIZE: int = 1000
+    MAX_BULK_IDS: int = 100
+    COUNTER_BATCH_SIZE: int = 1000
+    TRENDING_HALF_LIFE_HOURS: float = 48
+    TRENDING_WINDOW_HALF_LIVES: int = 10  # старше вклад меньше 0.1%
+    TRENDING_BATCH_SIZE: int = 1000
+    FEED_FANOUT_LIMIT: int = 10000
+    FEED_BACKFILL_SIZE: int = 500
+    FEED_BATCH_SIZE: int = 1000
+    SIMILAR_RECIPES_LIMIT: int = 10
+    SIMILARITY_BLOCK_SIZE: int = 256
+    SIMILARITY_TAG_WEIGHT: float = 0.5
+    SIMILARITY_MAX_DF: float = 0.2
+    SIMILARITY_MIN_DOCUMENTS: int = 100  # рецептов для отсева по max_df
+    SIMILARITY_SYNC_MARGIN: int = 60  # секунд повторного чтения изменений
@@ -76,6 +76,11 @@ if os.getenv("DATABASES", "postgres") == "sqlite":
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Тесты параллельных запросов требуют файловой БД:
+            # in-memory база не допускает одновременной записи.
+            # TEST используется только при запуске manage.py test.
+            "OPTIONS": {"timeout": 30},
+            "TEST": {"NAME": BASE_DIR / "test.sqlite3"},
         }
     }
 else:
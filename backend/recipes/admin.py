@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
+from api.search import recipe_search_index
+from api.services import refresh_recipe_in_shopping_lists
 from foodgram.constants import Constants
 from recipes.models import (
     Cart,
@@ -27,6 +29,12 @@ class RecipeIngredientInLine(admin.TabularInline):
 
     model = RecipeIngredient
     extra = 0
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
 
 
 class FavoriteInline(admin.TabularInline):
@@ -34,6 +42,12 @@ class FavoriteInline(admin.TabularInline):
 
     model = FavoritRecipe
     extra = 0
+    autocomplete_fields = ('user',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'user'
+        )
 
 
 class ShoppingCartInline(admin.TabularInline):
@@ -41,6 +55,12 @@ class ShoppingCartInline(admin.TabularInline):
 
     model = Cart
     extra = 0
+    autocomplete_fields = ('user',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'user'
+        )
 
 
 @admin.register(Recipe)
@@ -68,18 +88,41 @@ class RecipeAdmin(BaseFoodgramAdmin):
     list_filter = ("author", "tags__name")
     list_display_links = ('name', 'id')
     date_hierarchy = 'pub_date'
-    filter_horizontal = ('tags',)
+    autocomplete_fields = ('author', 'tags')
+    list_select_related = ('author',)
     inlines = (RecipeIngredientInLine, ShoppingCartInline, FavoriteInline)
 
-    @admin.display(description="Добавили в избранное")
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'ingredients'
+        )
+
+    @staticmethod
+    def get_ingredient_ids(recipe: Recipe):
+        return set(recipe.recipe_ingredient.values_list(
+            'ingredient_id', flat=True
+        ))
+
+    def save_related(self, request, form, formsets, change):
+        old_ingredient_ids = self.get_ingredient_ids(form.instance)
+        super().save_related(request, form, formsets, change)
+        recipe_search_index.update(form.instance)
+        refresh_recipe_in_shopping_lists(
+            form.instance,
+            old_ingredient_ids | self.get_ingredient_ids(form.instance)
+        )
+
+    @admin.display(
+        description="Добавили в избранное", ordering='favorites_count'
+    )
     def in_favorite(self, obj):
         """Счетчик добавлений рецепта в избранное."""
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @admin.display(description='Теги')
     def get_tags(self, recipe: Recipe):
-        """Список ингредиентов рецепта."""
-        return list(recipe.tags.only('name'))
+        """Список тегов рецепта."""
+        return list(recipe.tags.all())
 
     get_tags.short_description = "Тэги"
 
@@ -92,7 +135,7 @@ class RecipeAdmin(BaseFoodgramAdmin):
     @admin.display(description='Ингредиенты')
     def ingredients_list(self, recipe: Recipe):
         """Список ингредиентов рецепта."""
-        return list(recipe.ingredients.only('name'))
+        return list(recipe.ingredients.all())
 
 
 @admin.register(Tag)
@@ -108,7 +151,7 @@ class TagAdmin(BaseFoodgramAdmin):
     search_fields = (
         "name",
         "color",
-        "color_code",
+        "slug",
     )
     list_editable = ("slug",)
     list_display_links = ('color_code', 'id')
@@ -136,8 +179,11 @@ class FavoritRecipeAdmin(BaseFoodgramAdmin):
 
     list_display = ('user', 'recipe', 'added_date')
     search_fields = ('user__username', 'recipe__name')
-    list_editable = ('recipe',)
     list_filter = ('recipe',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    # Без list_editable: виджет автодополнения запрашивает выбранный
+    # рецепт отдельно для каждой строки списка.
 
 
 @admin.register(Cart)
@@ -147,3 +193,5 @@ class CartAdmin(BaseFoodgramAdmin):
     list_display = ('id', '__str__', 'user', 'recipe', 'added_date')
     list_display_links = ('__str__', 'id')
     search_fields = ('recipe__name', 'user__username')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
@@ -0,0 +1,86 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.similarity import FeatureMatrix, affected_rows, build
+from foodgram.constants import Constants
+from recipes.models import VersionStamp
+
+STAMP_KEY = 'similarity'
+
+
+class Command(BaseCommand):
+    help = (
+        'Расчет похожих рецептов по ингредиентам и тегам. '
+        'По умолчанию пересчитываются только рецепты, затронутые '
+        'изменениями с прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать соседей всех рецептов.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов.'
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=Constants.SIMILARITY_BLOCK_SIZE,
+            help='Количество рецептов в одном блоке.'
+        )
+
+    @staticmethod
+    def get_stamped_ids(since, *prefixes):
+        """Рецепты с метками версий prefixes новее прошлого запуска."""
+        query = Q()
+        for prefix in prefixes:
+            query |= Q(key__startswith=f'{prefix}:')
+        return [
+            int(key.split(':')[1])
+            for key in VersionStamp.objects.filter(
+                query, modified__gt=since
+            ).values_list('key', flat=True)
+        ]
+
+    def handle(self, *args, **options):
+        # Метки версий ставятся до фиксации транзакций, поэтому изменения
+        # последних секунд перед запуском будут прочитаны еще раз.
+        started = timezone.now() - timedelta(
+            seconds=Constants.SIMILARITY_SYNC_MARGIN
+        )
+        timer = time.monotonic()
+        stamp = VersionStamp.objects.filter(key=STAMP_KEY).first()
+        matrix = FeatureMatrix()
+        if options['full'] or stamp is None:
+            rows = matrix.rows(matrix.recipe_ids)
+        else:
+            # Состав ingredients:/tags: меняет сходство с другими
+            # рецептами, neighbors: — только собственный список соседей.
+            rows = affected_rows(
+                matrix,
+                self.get_stamped_ids(stamp.modified, 'ingredients', 'tags'),
+                Constants.SIMILAR_RECIPES_LIMIT,
+                self.get_stamped_ids(stamp.modified, 'neighbors')
+            )
+        total = build(
+            matrix, rows, options['workers'], options['block_size']
+        )
+        # auto_now перезаписал бы время запуска при save().
+        VersionStamp.objects.bulk_create(
+            [VersionStamp(key=STAMP_KEY)], ignore_conflicts=True
+        )
+        VersionStamp.objects.filter(key=STAMP_KEY).update(modified=started)
+        self.stdout.write(
+            f'Пересчитаны соседи {total} из {len(matrix.recipe_ids)} '
+            f'рецептов за {time.monotonic() - timer:.1f} с.'
+        )
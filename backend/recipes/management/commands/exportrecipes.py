@@ -0,0 +1,106 @@
+import base64
+import json
+import mimetypes
+import sys
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.db.models import Prefetch
+
+from foodgram.constants import Constants
+from recipes.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузка рецептов с ингредиентами, тегами и изображениями '
+        'в формате JSON Lines.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл для выгрузки, "-" для стандартного вывода.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=Constants.RECIPE_TRANSFER_BATCH_SIZE,
+            help='Количество рецептов, читаемых одним запросом.'
+        )
+        parser.add_argument(
+            '--image-paths',
+            action='store_true',
+            help='Выгружать пути к изображениям вместо их содержимого.'
+        )
+
+    @staticmethod
+    def encode_image(name):
+        mime = mimetypes.guess_type(name)[0] or 'image/jpeg'
+        with default_storage.open(name) as image:
+            content = base64.b64encode(image.read()).decode()
+        return f'data:{mime};base64,{content}'
+
+    def serialize(self, recipe, image_paths):
+        image = recipe.image.name
+        if image and not image_paths:
+            image = self.encode_image(image)
+        return {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'author': recipe.author.email,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                } for item in recipe.recipe_ingredient.all()
+            ],
+            'image': image,
+        }
+
+    def get_batches(self, batch_size):
+        """Чтение рецептов пачками по возрастанию id."""
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        ).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1].id
+
+    def handle(self, *args, **options):
+        to_stdout = options['path'] == '-'
+        report = self.stderr if to_stdout else self.stdout
+        file = (
+            sys.stdout if to_stdout
+            else open(options['path'], 'w', encoding='utf-8')
+        )
+        exported = 0
+        started = time.monotonic()
+        try:
+            for batch in self.get_batches(options['batch_size']):
+                for recipe in batch:
+                    file.write(json.dumps(
+                        self.serialize(recipe, options['image_paths']),
+                        ensure_ascii=False
+                    ) + '\n')
+                exported += len(batch)
+        finally:
+            if not to_stdout:
+                file.close()
+        elapsed = max(time.monotonic() - started, 1e-6)
+        report.write(
+            f'Выгружено рецептов: {exported} за {elapsed:.1f} с '
+            f'({exported / elapsed:.0f} рецептов/с).'
+        )
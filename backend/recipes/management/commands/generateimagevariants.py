@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from api.images import render_variants, store_variants, variants_are_ready
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание уменьшенных вариантов изображений рецептов, '
+        'для которых они еще не созданы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов для обработки изображений.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать варианты для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        pending = {
+            recipe.id: recipe.image.name
+            for recipe in Recipe.objects.only(
+                'id', 'image', 'image_variants'
+            ).iterator()
+            if recipe.image
+            and (options['force'] or not variants_are_ready(recipe))
+        }
+        # Дочерние процессы работают только с файлами,
+        # соединения с БД не должны наследоваться при fork.
+        connections.close_all()
+        created = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(render_variants, name): recipe_id
+                for recipe_id, name in pending.items()
+            }
+            for future in as_completed(futures):
+                recipe_id = futures[future]
+                try:
+                    store_variants(recipe_id, future.result())
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                else:
+                    created += 1
+        self.stdout.write(
+            f'Рецептов без вариантов: {len(pending)}, '
+            f'обработано: {created}, ошибок: {failed}.'
+        )
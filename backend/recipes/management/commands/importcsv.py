@@ -1,41 +1,175 @@
 import csv
+from itertools import islice
 
 from django.core.management import BaseCommand
+from django.db import connection, transaction
 
+from api.conditional import bump_version
+from api.indexes import ingredient_index, tag_catalog
+from foodgram.constants import Constants
 from foodgram.settings import CSV_FILES_DIR
 from recipes.models import Ingredient, Tag
 
 TABLES = (
-    (Tag, 'tags.csv'),
-    (Ingredient, 'ingredients.csv')
-)
-fields = (
-    ('name', 'color', 'slug'),
-    ('name', 'measurement_unit')
+    (Tag, 'tags.csv', ('name', 'color', 'slug')),
+    (Ingredient, 'ingredients.csv', ('name', 'measurement_unit'))
 )
 
 
 class Command(BaseCommand):
-    help = 'Команда для создания БД на основе имеющихся csv файлов'
+    help = (
+        'Команда для создания БД на основе имеющихся csv файлов. '
+        'Существующие записи пропускаются, повторный запуск безопасен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=Constants.CSV_BATCH_SIZE,
+            help='Количество строк в одной вставке.'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY в PostgreSQL.'
+        )
+
+    @staticmethod
+    def read_rows(file, fields):
+        """
+        Строки файла в порядке колонок fields.
+        Первая строка считается заголовком, если совпадает
+        с названиями полей, иначе колонки идут в порядке fields.
+        """
+        reader = csv.reader(file, delimiter=',')
+        first = next(reader, None)
+        if first is None:
+            return
+        if set(first) == set(fields):
+            order = [first.index(field) for field in fields]
+        else:
+            order = range(len(fields))
+            yield first
+        for row in reader:
+            if row:
+                yield [row[index] for index in order]
+
+    @staticmethod
+    def copy_rows(model, fields, rows):
+        """
+        Загрузка через COPY во временную таблицу и вставка
+        с пропуском конфликтов. Возвращает число вставленных строк.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(
+            model._meta.get_field(field).column
+        ) for field in fields)
+        temporary = connection.ops.quote_name(
+            f'import_{model._meta.db_table}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {temporary} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY {temporary} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                CSVBuffer(rows)
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM {temporary} ON CONFLICT DO NOTHING'
+            )
+            return cursor.rowcount
 
-    def handle(self, *args, **kwargs):
-        print("Старт импорта")
+    @staticmethod
+    def bulk_rows(model, fields, rows, batch_size):
+        """Вставка пачками с пропуском конфликтов."""
+        before = model.objects.count()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(
+                (model(**dict(zip(fields, row))) for row in batch),
+                ignore_conflicts=True
+            )
+        return model.objects.count() - before
+
+    def load(self, model, csv_f, fields, options):
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        counter = RowCounter()
+        with open(f'{CSV_FILES_DIR}/{csv_f}', encoding='utf-8') as f:
+            rows = counter.count(self.read_rows(f, fields))
+            if use_copy:
+                inserted = self.copy_rows(model, fields, rows)
+            else:
+                inserted = self.bulk_rows(
+                    model, fields, rows, options['batch_size']
+                )
+        self.stdout.write(
+            f'{model.__name__}: добавлено {inserted}, '
+            f'пропущено {counter.total - inserted}.'
+        )
+        return inserted
+
+    def handle(self, *args, **options):
+        self.stdout.write("Старт импорта")
         try:
-            for model, csv_f in TABLES:
-                with open(
-                    f'{CSV_FILES_DIR}/{csv_f}', encoding='utf-8'
-                ) as f:
-                    reader = csv.DictReader(f, delimiter=',')
-                    for row in reader:
-                        if model in fields:
-                            row[fields[model][2]] = row.pop(fields[model][0])
-                        obj, created = model.objects.get_or_create(**row)
-                    if created:
-                        print(f'{obj} загружен в таблицу {model.__name__}')
-            print("Загрузка данных завершена.")
+            with transaction.atomic():
+                inserted = {
+                    model: self.load(model, csv_f, fields, options)
+                    for model, csv_f, fields in TABLES
+                }
+            if inserted[Tag]:
+                bump_version('tag')
+                tag_catalog.invalidate()
+            if inserted[Ingredient]:
+                bump_version('ingredient')
+                ingredient_index.invalidate()
+            self.stdout.write("Загрузка данных завершена.")
 
         except Exception as error:
-            print(f"Сбой в работе импорта: {error}.")
+            self.stderr.write(f"Сбой в работе импорта: {error}.")
 
         finally:
-            print("Завершена работа импорта.")
+            self.stdout.write("Завершена работа импорта.")
+
+
+class RowCounter:
+    """Подсчет строк, прошедших через генератор."""
+
+    def __init__(self):
+        self.total = 0
+
+    def count(self, rows):
+        for row in rows:
+            self.total += 1
+            yield row
+
+
+class CSVBuffer:
+    """Файлоподобный объект, отдающий строки в формате CSV для COPY."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.pending = ''
+        self.writer = csv.writer(self)
+
+    def write(self, line):
+        self.pending += line
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
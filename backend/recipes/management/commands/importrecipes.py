@@ -0,0 +1,230 @@
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from api.conditional import bump_versions
+from api.feed import fan_out
+from api.fields import Base64ImageField
+from api.images import normalize_executor, normalize_image
+from api.search import recipe_search_index
+from api.services import update_counters
+from foodgram.constants import Constants
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+def load_image(value):
+    """
+    Изображение из data URI проходит ту же нормализацию,
+    что и при загрузке через API. Путь используется как есть,
+    если файл уже есть в хранилище.
+    """
+    if not value:
+        return None
+    if not value.startswith('data:image'):
+        return value if default_storage.exists(value) else None
+    upload = Base64ImageField().decode(value)
+    try:
+        return normalize_image(upload)
+    finally:
+        upload.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка рецептов из файла JSON Lines, созданного exportrecipes. '
+        'Рецепты, которые уже есть у автора, пропускаются. '
+        'Варианты изображений создаются командой generateimagevariants.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSON Lines.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=Constants.RECIPE_TRANSFER_BATCH_SIZE,
+            help='Количество рецептов в одной транзакции.'
+        )
+        parser.add_argument(
+            '--author',
+            help='Username автора рецептов, чей автор не найден по email.'
+        )
+
+    def get_authors(self, records):
+        emails = {record.get('author') for record in records}
+        authors = dict(User.objects.filter(
+            email__in=emails
+        ).values_list('email', 'id'))
+        if self.default_author_id:
+            for email in emails - authors.keys():
+                authors[email] = self.default_author_id
+        return authors
+
+    @staticmethod
+    def is_valid(record, ingredients, tags):
+        """Те же ограничения, что у рецептов, созданных через API."""
+        name, text = record['name'], record['text']
+        return bool(
+            ingredients and None not in ingredients and None not in tags
+            and isinstance(name, str) and name.strip()
+            and len(name) <= Constants.MAX_CHAR_LENGTH
+            and isinstance(text, str) and text.strip()
+            and Constants.MIN_COOKING_TIME <= record['cooking_time']
+            <= Constants.MAX_COOKING_TIME
+            and all(
+                Constants.MIN_AMOUNT <= amount <= Constants.MAX_AMOUNT
+                for amount in ingredients.values()
+            )
+        )
+
+    def prepare(self, record, authors, existing):
+        """Рецепт и его связи или None, если запись нельзя загрузить."""
+        author_id = authors.get(record['author'])
+        key = (author_id, record['name'])
+        if author_id is None or key in existing:
+            return None
+        ingredients = {
+            self.ingredients.get(
+                (item['name'], item['measurement_unit'])
+            ): item['amount'] for item in record['ingredients']
+        }
+        tags = {self.tags.get(slug) for slug in record['tags']}
+        if not self.is_valid(record, ingredients, tags):
+            return None
+        existing.add(key)
+        recipe = Recipe(
+            author_id=author_id,
+            name=record['name'],
+            text=record['text'],
+            cooking_time=record['cooking_time']
+        )
+        names = [item['name'] for item in record['ingredients']]
+        return recipe, ingredients, tags, names
+
+    def prepare_chunk(self, records):
+        authors = self.get_authors(records)
+        existing = set(Recipe.objects.filter(
+            author_id__in=set(authors.values()),
+            name__in={record.get('name') for record in records}
+        ).values_list('author_id', 'name'))
+        prepared = []
+        for record in records:
+            try:
+                item = self.prepare(record, authors, existing)
+            except (KeyError, TypeError):
+                item = None
+            if item:
+                prepared.append((item, record.get('image')))
+        images = normalize_executor.map(
+            self.safe_load_image, [image for _, image in prepared]
+        )
+        items = []
+        for (item, _), image in zip(prepared, images):
+            if image is not None:
+                item[0].image = image
+                items.append(item)
+        return items
+
+    @staticmethod
+    def safe_load_image(value):
+        try:
+            return load_image(value)
+        except (ValidationError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def assign_ids(recipes):
+        """Получение id, если СУБД не возвращает их из bulk_create."""
+        if all(recipe.pk for recipe in recipes):
+            return
+        ids = {
+            (author_id, name): pk
+            for pk, author_id, name in Recipe.objects.filter(
+                author_id__in={recipe.author_id for recipe in recipes},
+                name__in={recipe.name for recipe in recipes}
+            ).values_list('id', 'author_id', 'name')
+        }
+        for recipe in recipes:
+            recipe.pk = ids[(recipe.author_id, recipe.name)]
+
+    @transaction.atomic
+    def save_chunk(self, items):
+        recipes = Recipe.objects.bulk_create(item[0] for item in items)
+        self.assign_ids(recipes)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for recipe, ingredients, _, _ in items
+            for ingredient_id, amount in ingredients.items()
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, _, tags, _ in items
+            for tag_id in tags
+        )
+        recipe_search_index.add(
+            (recipe, names) for recipe, _, _, names in items
+        )
+        update_counters(
+            User, 'recipes_count',
+            Counter(recipe.author_id for recipe in recipes)
+        )
+        fan_out(recipes)
+        bump_versions(f'ingredients:{recipe.pk}' for recipe in recipes)
+
+    @staticmethod
+    def parse(lines):
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return records
+
+    def handle(self, *args, **options):
+        self.default_author_id = None
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден.'
+                )
+            self.default_author_id = author.id
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        imported = skipped = 0
+        started = time.monotonic()
+        with open(options['path'], encoding='utf-8') as file:
+            lines = (line for line in file if line.strip())
+            while True:
+                chunk = list(islice(lines, options['batch_size']))
+                if not chunk:
+                    break
+                items = self.prepare_chunk(self.parse(chunk))
+                if items:
+                    self.save_chunk(items)
+                imported += len(items)
+                skipped += len(chunk) - len(items)
+                self.stdout.write(
+                    f'Загружено {imported}, пропущено {skipped}.'
+                )
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'Импортировано рецептов: {imported}, пропущено: {skipped} '
+            f'за {elapsed:.1f} с ({imported / elapsed:.0f} рецептов/с).'
+        )
@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from api.search import recipe_search_index
+
+
+class Command(BaseCommand):
+    help = 'Построение полнотекстового индекса рецептов с нуля'
+
+    def handle(self, *args, **kwargs):
+        indexed = recipe_search_index.rebuild()
+        self.stdout.write(f'Проиндексировано рецептов: {indexed}.')
@@ -0,0 +1,66 @@
+from django.core.management import BaseCommand
+
+from api.services import get_shopping_list_totals, refresh_shopping_lists
+from foodgram.constants import Constants
+from recipes.models import Cart, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет сумм списков покупок с нуля. '
+        'С флагом --check только поиск расхождений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не изменяя данные.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=Constants.SHOPPING_LIST_BATCH_SIZE,
+            help='Количество пользователей в одной пачке.'
+        )
+
+    @staticmethod
+    def get_drift(user_ids):
+        expected = {
+            (row['recipe__shop_list__user_id'], row['ingredient_id']):
+            row['total']
+            for row in get_shopping_list_totals(user_ids)
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.filter(
+                user_id__in=user_ids
+            ).values_list('user_id', 'ingredient_id', 'amount')
+        }
+        return {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(Cart.objects.values_list('user_id', flat=True))
+            | set(ShoppingListItem.objects.values_list('user_id', flat=True))
+        )
+        batch_size = options['batch_size']
+        drifted_users = drifted_rows = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            drift = self.get_drift(batch)
+            drifted_rows += len(drift)
+            drifted_users += len({user_id for user_id, _ in drift})
+            if not options['check']:
+                refresh_shopping_lists(batch)
+        self.stdout.write(
+            f'Пользователей: {len(user_ids)}, '
+            f'с расхождениями: {drifted_users}, '
+            f'расходящихся строк: {drifted_rows}.'
+        )
+        if not options['check']:
+            self.stdout.write('Списки покупок пересчитаны.')
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from foodgram.constants import Constants
+from recipes.models import Cart, FavoritRecipe, Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoritRecipe, 'recipe'),
+    (Recipe, 'cart_count', Cart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'following'),
+)
+
+
+def count_subquery(model, field):
+    """Фактическое число связанных записей для внешнего объекта."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')[:1]
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка счетчиков избранного, списков покупок, рецептов '
+        'и подписчиков с фактическими данными и исправление расхождений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, не изменяя данные.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=Constants.COUNTER_BATCH_SIZE,
+            help='Количество объектов в одной пачке.'
+        )
+
+    @staticmethod
+    def get_batches(model, batch_size):
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
+
+    def reconcile(self, model, counter, related, field, options):
+        """
+        Исправление пачками. Значение пересчитывается в самом UPDATE,
+        поэтому параллельные изменения счетчиков не теряются.
+        """
+        drifted = 0
+        for batch in self.get_batches(model, options['batch_size']):
+            with transaction.atomic():
+                wrong = model.objects.filter(pk__in=batch).alias(
+                    actual=count_subquery(related, field)
+                ).exclude(**{counter: F('actual')})
+                wrong_ids = list(wrong.values_list('pk', flat=True))
+                drifted += len(wrong_ids)
+                if wrong_ids and not options['check']:
+                    model.objects.filter(pk__in=wrong_ids).update(
+                        **{counter: count_subquery(related, field)}
+                    )
+        self.stdout.write(
+            f'{model.__name__}.{counter}: расхождений {drifted}.'
+        )
+
+    def handle(self, *args, **options):
+        for model, counter, related, field in COUNTERS:
+            self.reconcile(model, counter, related, field, options)
+        if not options['check']:
+            self.stdout.write('Счетчики исправлены.')
@@ -0,0 +1,83 @@
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.constants import Constants
+from recipes.models import Cart, FavoritRecipe, Recipe
+
+EVENTS = (FavoritRecipe, Cart)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет популярности рецептов для сортировки ordering=trending: '
+        'добавления в избранное и список покупок с экспоненциальным '
+        'затуханием. Запускается по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life',
+            type=float,
+            default=Constants.TRENDING_HALF_LIFE_HOURS,
+            help='Период полураспада вклада добавления, часов.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=Constants.TRENDING_BATCH_SIZE,
+            help='Количество рецептов в одном обновлении.'
+        )
+
+    @staticmethod
+    def get_scores(now, half_life):
+        """
+        Сумма вкладов 0.5 ** (возраст / период полураспада)
+        по событиям в окне TRENDING_WINDOW_HALF_LIVES периодов.
+        """
+        since = now - half_life * Constants.TRENDING_WINDOW_HALF_LIVES
+        events = np.fromiter(
+            chain.from_iterable(
+                (recipe_id, added_date.timestamp())
+                for model in EVENTS
+                for recipe_id, added_date in model.objects.filter(
+                    added_date__gte=since
+                ).order_by().values_list('recipe_id', 'added_date').iterator()
+            ),
+            dtype=np.float64
+        ).reshape(-1, 2)
+        recipe_ids, positions = np.unique(
+            events[:, 0].astype(np.int64), return_inverse=True
+        )
+        weights = 0.5 ** (
+            (now.timestamp() - events[:, 1]) / half_life.total_seconds()
+        )
+        return dict(zip(
+            recipe_ids.tolist(), np.bincount(positions, weights).tolist()
+        ))
+
+    def handle(self, *args, **options):
+        half_life = timedelta(hours=options['half_life'])
+        scores = self.get_scores(timezone.now(), half_life)
+        stale = set(Recipe.objects.filter(
+            trending_score__gt=0
+        ).values_list('id', flat=True)) - scores.keys()
+        scores.update(dict.fromkeys(stale, 0))
+        updates = [
+            Recipe(id=recipe_id, trending_score=score)
+            for recipe_id, score in scores.items()
+        ]
+        batch_size = options['batch_size']
+        for start in range(0, len(updates), batch_size):
+            with transaction.atomic():
+                Recipe.objects.bulk_update(
+                    updates[start:start + batch_size], ('trending_score',)
+                )
+        self.stdout.write(
+            f'Обновлена популярность {len(updates) - len(stale)} рецептов, '
+            f'сброшена у {len(stale)}.'
+        )
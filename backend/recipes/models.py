@@ -62,6 +62,39 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов рецептов.
+    """
+
+    def with_user_flags(self, user):
+        """
+        Аннотация флагов is_favorited и is_in_shopping_cart
+        для текущего пользователя.
+        """
+        if not user or user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                FavoritRecipe.objects.filter(
+                    recipe=models.OuterRef('pk'), user=user
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                Cart.objects.filter(
+                    recipe=models.OuterRef('pk'), user=user
+                )
+            ),
+        )
+
+
 class Recipe(models.Model):
     """
     Модель рецепта.
@@ -75,6 +108,12 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Изображение'
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     ingredients = models.ManyToManyField(
         'Ingredient',
         verbose_name='Ингредиент',
@@ -108,6 +147,24 @@ class Recipe(models.Model):
         auto_now_add=True,
         editable=False
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавили в избранное',
+        default=0,
+        editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name='Добавили в список покупок',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность за последнее время',
+        default=0,
+        db_index=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         constraints = (
@@ -184,6 +241,7 @@ class FavoritRecipe(models.Model):
     added_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата добавления в избранное',
+        db_index=True
     )
 
     class Meta:
@@ -217,6 +275,7 @@ class Cart(models.Model):
     added_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата добавления в список покупок',
+        db_index=True
     )
 
     class Meta:
@@ -231,3 +290,180 @@ class Cart(models.Model):
 
     def __str__(self):
         return f'{self.recipe.name} -- {self.user.username}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Пересчитывается при изменении списка покупок и состава рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_list_item_uniq'
+            ),
+        )
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+    def __str__(self):
+        return f'{self.ingredient.name} -- {self.user.username}'
+
+
+class RecipeSearchTerm(models.Model):
+    """
+    Инвертированный индекс полнотекстового поиска рецептов.
+    Хранит частоту основы слова в рецепте и длину документа.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='search_terms'
+    )
+    term = models.CharField(
+        'Основа слова',
+        max_length=Constants.MAX_TERM_LENGTH
+    )
+    frequency = models.PositiveIntegerField('Частота')
+    document_length = models.PositiveIntegerField('Длина документа')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'recipe'),
+                name='search_term_recipe_uniq'
+            ),
+        )
+        verbose_name = 'Поисковый терм'
+        verbose_name_plural = 'Поисковые термы'
+
+    def __str__(self):
+        return f'{self.term} -- {self.recipe_id}'
+
+
+class VersionStamp(models.Model):
+    """
+    Версия данных для условных GET-запросов (ETag / Last-Modified).
+    Увеличивается сигналами при изменении связанных моделей.
+    """
+    key = models.CharField(
+        'Ключ',
+        max_length=Constants.MAX_CHAR_LENGTH,
+        unique=True
+    )
+    version = models.PositiveBigIntegerField('Версия', default=1)
+    modified = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Лента подписок пользователя: рецепты авторов, на которых он подписан.
+    Заполняется при публикации рецепта и при оформлении подписки.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='timeline',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='timeline_user_recipe_uniq'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        )
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+    def __str__(self):
+        return f'{self.recipe_id} -- {self.user_id}'
+
+
+class RecipeNeighbor(models.Model):
+    """
+    Похожие рецепты: ближайшие соседи рецепта по ингредиентам и тегам.
+    Рассчитываются командой buildsimilarrecipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='neighbors',
+        on_delete=models.CASCADE
+    )
+    neighbor = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='neighbor_of',
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'neighbor'),
+                name='recipe_neighbor_uniq'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='recipe_neighbor_score_idx'
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.neighbor_id}'
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from foodgram.constants import Constants
+from recipes.models import Cart, FavoritRecipe, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class AdminChangelistQueriesTests(TestCase):
+    """
+    Число запросов страницы списка в админке не зависит
+    от количества строк на странице.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com',
+            first_name='Admin', last_name='Admin', password='Pass-12345'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            ) for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            ) for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """Рецепты разных авторов с тегами, ингредиентами и добавлениями."""
+        for number in range(Recipe.objects.count(), count):
+            author = User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Author', last_name='Author'
+            )
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image=f'recipes/images/{number}.png'
+            )
+            recipe.tags.set(self.tags)
+            for ingredient in self.ingredients:
+                recipe.recipe_ingredient.create(
+                    ingredient=ingredient, amount=100
+                )
+            FavoritRecipe.objects.create(user=author, recipe=recipe)
+            Cart.objects.create(user=author, recipe=recipe)
+
+    def assert_constant_queries(self, url_name):
+        url = reverse(url_name)
+        self.add_rows(1)
+        with CaptureQueriesContext(connection) as single:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(Constants.MAX_PAGE_SIZE)
+        with self.assertNumQueries(len(single.captured_queries)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_recipe_changelist(self):
+        self.assert_constant_queries('admin:recipes_recipe_changelist')
+
+    def test_favorite_changelist(self):
+        self.assert_constant_queries('admin:recipes_favoritrecipe_changelist')
+
+    def test_cart_changelist(self):
+        self.assert_constant_queries('admin:recipes_cart_changelist')
+
+    def test_user_changelist(self):
+        self.assert_constant_queries('admin:users_foodgramuser_changelist')
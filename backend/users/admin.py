@@ -5,7 +5,7 @@ from django.contrib.auth.models import Group
 from rest_framework.authtoken.models import TokenProxy
 
 from foodgram.constants import Constants
-from recipes.models import Cart, FavoritRecipe, Recipe
+from recipes.models import Cart, FavoritRecipe
 from users.models import FoodgramUser, Subscription
 
 User = get_user_model()
@@ -18,11 +18,13 @@ admin.site.empty_value_display = "Не задано"
 class FavoriteInline(admin.TabularInline):
     model = FavoritRecipe
     extra = 1
+    autocomplete_fields = ('recipe',)
 
 
 class ShoppingCartInline(admin.TabularInline):
     model = Cart
     extra = 1
+    autocomplete_fields = ('recipe',)
 
 
 @admin.register(User)
@@ -58,16 +60,6 @@ class FoodgramUserAdmin(UserAdmin):
         """Булево значение является ли пользователь stuff"""
         return user.is_staff
 
-    @admin.display(description='Подписчиков')
-    def followers_count(self, user: FoodgramUser):
-        """Счетчик подписчиков пользователя."""
-        return user.following.count()
-
-    @admin.display(description='Рецептов')
-    def recipes_count(self, user: FoodgramUser):
-        """Счетчик рецептов пользователя."""
-        return Recipe.objects.filter(author=user).count()
-
 
 @admin.register(Subscription)
 class FollowAdmin(admin.ModelAdmin):
@@ -81,6 +73,8 @@ class FollowAdmin(admin.ModelAdmin):
     list_filter = ('user__username',)
     search_fields = ('user__username',)
     date_hierarchy = 'added_date'
+    list_select_related = ('user', 'following')
+    autocomplete_fields = ('user', 'following')
     list_per_page = Constants.MAX_PAGE_SIZE
     list_max_show_all = Constants.MAX_PAGE_SIZE
 
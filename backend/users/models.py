@@ -22,6 +22,16 @@ class FoodgramUser(AbstractUser):
         max_length=Constants.MAX_USERNAME_LENGTH,
         verbose_name='Роль'
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
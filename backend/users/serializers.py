@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model, password_validation
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 
+from api.fields import ImageVariantsField
 from recipes.models import Recipe
 from users.models import Subscription
 
@@ -52,22 +55,44 @@ class UserReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed')
 
+    @staticmethod
+    def get_followed_ids(request):
+        """
+        Множество id авторов, на которых подписан текущий пользователь.
+        Загружается одним запросом и кешируется на время запроса.
+        """
+        followed_ids = getattr(request, '_followed_ids', None)
+        if followed_ids is None:
+            followed_ids = set(Subscription.objects.filter(
+                user=request.user
+            ).values_list('following_id', flat=True))
+            request._followed_ids = followed_ids
+        return followed_ids
+
     def get_is_subscribed(self, following):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return Subscription.objects.filter(
-            user=request.user,
-            following=following
-        ).exists()
+        return following.id in self.get_followed_ids(request)
+
+
+class UserProfileSerializer(UserReadSerializer):
+    """Профиль пользователя со счетчиками рецептов и подписчиков."""
+
+    class Meta(UserReadSerializer.Meta):
+        fields = UserReadSerializer.Meta.fields + (
+            'recipes_count', 'followers_count'
+        )
 
 
 class RecipeProfileSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения рецептов в профиле пользователя."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -96,7 +121,7 @@ class SubscribeSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.ReadOnlyField(
-        source='following.recipes.count'
+        source='following.recipes_count'
     )
 
     class Meta:
@@ -107,37 +132,34 @@ class SubscribeSerializer(serializers.ModelSerializer):
         read_only_fields = ('email', 'username', 'first_name', 'last_name')
 
     def get_is_subscribed(self, follow_obj):
+        """Сериализуемый объект и есть подписка текущего пользователя."""
         user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=follow_obj.user,
-            following=follow_obj.following
-        ).exists()
+        return not user.is_anonymous
 
     def get_recipes(self, follow_obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=follow_obj.following)
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        recipes = getattr(follow_obj.following, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            recipes_limit = request.GET.get('recipes_limit')
+            recipes = Recipe.objects.filter(author=follow_obj.following)
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipeProfileSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        """Счетчик рецептов текущего пользователя."""
-        return obj.recipes.count()
-
     def validate(self, data):
         following = self.context.get('following')
         user = self.context.get('request').user
-        follow_exists = Subscription.objects.filter(
-            following=following,
-            user=user
-        ).exists()
         if following == user:
             raise ValidationError('Нельзя подписаться на себя.')
-        if follow_exists:
-            raise ValidationError(
-                f'Вы уже подписаны на пользователя {following}.',
-            )
         return data
+
+    def create(self, validated_data):
+        """Повторная подписка отсекается ограничением уникальности в БД."""
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы уже подписаны на пользователя '
+                f'{validated_data["following"]}.'
+            ]})
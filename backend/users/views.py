@@ -1,17 +1,20 @@
 from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Prefetch, Subquery
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from api.pagination import Pagination
+from recipes.models import Recipe
 from users.models import Subscription
 from users.permissions import IsRequestUserOrAdminOrHigherOrReadonly
 from users.serializers import (SubscribeSerializer,
                                UserCreateSerializer,
-                               UserReadSerializer
+                               UserProfileSerializer
                                )
 
 User = get_user_model()
@@ -28,10 +31,12 @@ class CustomUserViewSet(viewsets.GenericViewSet,
     permission_classes = [IsRequestUserOrAdminOrHigherOrReadonly, ]
     pagination_class = Pagination
     serializer_class = UserCreateSerializer
+    filter_backends = [OrderingFilter, ]
+    ordering_fields = ('id', 'recipes_count', 'followers_count')
 
     def get_serializer_class(self):
         if self.action in ['retrieve', 'list', 'me']:
-            return UserReadSerializer
+            return UserProfileSerializer
         elif self.action == 'set_password':
             return SetPasswordSerializer
         elif self.action in ['subscriptions', 'subscribe']:
@@ -48,7 +53,7 @@ class CustomUserViewSet(viewsets.GenericViewSet,
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.request.user.set_password(serializer.data['new_password'])
-        self.request.user.save()
+        self.request.user.save(update_fields=['password'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -68,7 +73,21 @@ class CustomUserViewSet(viewsets.GenericViewSet,
     )
     def subscriptions(self, request: Request):
         """Представление всех подписок пользователя."""
-        follows = Subscription.objects.filter(user=self.request.user)
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author_id=OuterRef('author_id')
+                ).values('id')[:int(recipes_limit)]
+            ))
+        follows = Subscription.objects.filter(
+            user=self.request.user
+        ).select_related('following').prefetch_related(Prefetch(
+            'following__recipes',
+            queryset=recipes,
+            to_attr='limited_recipes'
+        ))
         pages = self.paginate_queryset(follows)
         serializer = self.get_serializer(
             pages,
@@ -97,15 +116,13 @@ class CustomUserViewSet(viewsets.GenericViewSet,
     @subscribe.mapping.delete
     def delete_subscribe(self, request: Request, pk: int):
         """Отписаться от пользователя"""
-        user = request.user
-        following = get_object_or_404(User, id=pk)
-        if Subscription.objects.filter(
-                following=following,
-                user=user).exists():
-            Subscription.objects.get(
-                following=following,
-                user=user).delete()
+        deleted, _ = Subscription.objects.filter(
+            user=request.user,
+            following_id=pk
+        ).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        following = get_object_or_404(User, id=pk)
         return Response(
             data={'errors': f'Вы не подписаны на пользователя {following}'},
             status=status.HTTP_400_BAD_REQUEST